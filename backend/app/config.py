@@ -14,3 +14,70 @@ MAX_CONTENT_CHARS: int = 8000
 
 MONGO_URI: str = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME: str = "paper_playground"
+
+# Resumable story streams: generation output is kept in a per-session replay
+# buffer so a client can reconnect with ?offset=N after a disconnect.
+STREAM_BUFFER_MAX_CHARS: int = 256_000
+STREAM_RETAIN_SECONDS: int = 300  # keep finished streams around for late reconnects
+
+# Truncated completions (finish_reason "length" or unbalanced JSON) are resumed
+# with up to this many continuation requests before salvaging a valid prefix.
+MAX_CONTINUATIONS: int = 2
+
+# Batch story-generation jobs
+JOB_MAX_CONCURRENCY: int = 4    # generations running at once across all jobs
+JOB_MAX_ITEMS: int = 50         # stories per job
+JOB_RETAIN_SECONDS: int = 3600  # keep finished jobs pollable for an hour
+
+# Text-to-speech: long lines are split into sentences that are synthesised
+# concurrently (per voice connection) and streamed back in order.
+TTS_MAX_CONCURRENCY: int = 3
+TTS_MIN_SENTENCE_CHARS: int = 24  # shorter fragments are merged with a neighbour
+
+# Story library listing
+STORY_PAGE_DEFAULT: int = 20
+STORY_PAGE_MAX: int = 100
+
+# Upload-by-hash: extracted text is remembered by the SHA-256 of the uploaded
+# bytes so clients can skip re-sending documents the server already knows.
+DOCUMENT_CACHE_MAX_ENTRIES: int = 500
+
+# Speculative generation: /story/start may kick off the OpenRouter call before
+# the WebSocket attaches. At the unattached cap the upstream call is closed and
+# resumed from the buffer on attach; sessions whose socket never arrives are
+# aborted to bound wasted spend.
+SPECULATIVE_START_DEFAULT: bool = os.getenv("SPECULATIVE_START", "false").lower() == "true"
+SPECULATIVE_MAX_BUFFER_CHARS: int = 16_000
+SPECULATIVE_ATTACH_TIMEOUT: float = 30.0
+
+# Circuit breakers and retries for OpenRouter, Sarvam and MongoDB
+BREAKER_FAILURE_THRESHOLD: int = 5   # consecutive failures before opening
+BREAKER_RESET_SECONDS: float = 30.0  # open → half-open probe delay
+BREAKER_PROBE_TIMEOUT: float = 60.0  # a half-open probe still unresolved after this counts as failed
+RETRY_MAX_ATTEMPTS: int = 4
+RETRY_BASE_DELAY: float = 0.5
+RETRY_MAX_DELAY: float = 10.0
+OPENROUTER_RETRY_DEADLINE: float = 45.0  # retries must finish within this budget
+SARVAM_RETRY_DEADLINE: float = 8.0
+
+# Segmented generation: the story is produced a quiz at a time as the player
+# advances, prefetching at most one segment ahead.
+SEGMENT_MAX_COUNT: int = 6
+SEGMENT_PREFETCH: bool = True
+SEGMENT_IDLE_SECONDS: int = 1800  # drop abandoned stories (and their prefetch)
+
+# WebSocket connection management (per worker)
+WS_MAX_CONNECTIONS: int = 1000
+WS_MAX_CONNECTIONS_PER_IP: int = 20
+WS_PING_INTERVAL: float = 20.0   # app-level {"type": "ping"} on voice sockets
+WS_PONG_TIMEOUT: float = 50.0    # drop clients that stop answering pings
+WS_IDLE_TIMEOUT: float = 300.0   # close sockets with no activity (see connection_service)
+WS_DRAIN_SECONDS: float = 25.0   # on shutdown, story streams get this long to finish
+
+# Avatars: custom (data-URI) avatars are stored once, content-addressed by
+# SHA-256, and served with immutable caching. "local" keeps blobs under
+# AVATAR_DIR; "gridfs" keeps them in MongoDB (shared by every worker).
+AVATAR_STORE: str = os.getenv("AVATAR_STORE", "local")
+AVATAR_DIR: str = os.getenv("AVATAR_DIR", "data/avatars")
+AVATAR_MAX_BYTES: int = 5_000_000
+AVATAR_VARIANTS: dict[str, int] = {"thumb": 128, "card": 384}  # longest side, px
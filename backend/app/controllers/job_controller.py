@@ -0,0 +1,109 @@
+from typing import List
+from fastapi import UploadFile, HTTPException, WebSocket, WebSocketDisconnect
+
+from app.config import JOB_MAX_ITEMS
+from app.models.job import JobStatus
+from app.controllers.story_controller import parse_characters
+from app.services.connection_service import Connection, connections, until_handoff
+from app.services.document_service import resolve_material
+from app.services.json_service import dumps_text
+from app.services.job_service import JobInput, submit_job, get_job, watch_job
+
+
+# ─── REST: submit a batch → returns job_id ────────────────────────────────────
+
+async def submit_job_controller(
+    character_json: str,
+    files: List[UploadFile],
+    prompt: str,
+    user_name: str = "",
+    owner_id: str = "",
+) -> dict:
+    """
+    Extracts every uploaded file and queues one generation per
+    (character, file) pair. A single file or a single character is paired
+    with every entry on the other side; otherwise the counts must match.
+    """
+    characters = parse_characters(character_json, many=True)
+
+    if len(characters) == 1:
+        characters = characters * len(files)
+    elif len(files) == 1:
+        files = files * len(characters)
+    elif len(characters) != len(files):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Got {len(files)} files and {len(characters)} characters; "
+                   "send one of either, or the same number of both.",
+        )
+
+    if len(files) > JOB_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A job may contain at most {JOB_MAX_ITEMS} stories.")
+
+    contents: dict[int, str] = {}  # the same UploadFile may be paired repeatedly
+    inputs = []
+    for character, file in zip(characters, files):
+        if id(file) not in contents:
+            content = await resolve_material(file)
+            if not content.strip():
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Uploaded file '{file.filename}' appears to be empty or unreadable.",
+                )
+            contents[id(file)] = content
+        inputs.append(JobInput(
+            filename=file.filename or "",
+            character=character,
+            file_content=contents[id(file)],
+            prompt=prompt or "",
+            user_name=user_name,
+            owner_id=owner_id,
+        ))
+
+    job = submit_job(inputs)
+    return {"job_id": job.job_id, "total": len(inputs)}
+
+
+# ─── REST: poll progress ──────────────────────────────────────────────────────
+
+async def get_job_controller(job_id: str) -> JobStatus:
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or has expired.")
+    return job.snapshot()
+
+
+# ─── WebSocket: subscribe to progress ─────────────────────────────────────────
+
+async def job_progress_ws_controller(websocket: WebSocket, job_id: str) -> None:
+    """
+    Sends {"type": "progress", "job": <JobStatus>} on every change and closes
+    after the job finishes. Unknown ids get {"type": "error", "detail": ...}.
+    """
+    async with connections.session(websocket, "job") as conn:
+        if conn is not None:
+            await _send_job_progress(conn, job_id)
+
+
+async def _send_job_progress(conn: Connection, job_id: str) -> None:
+    websocket = conn.websocket
+    job = get_job(job_id)
+    if job is None:
+        try:
+            await websocket.send_text(dumps_text({"type": "error", "detail": "Job not found or has expired."}))
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+        return
+
+    try:
+        async for snapshot in until_handoff(conn, watch_job(job)):
+            await conn.send_text(
+                dumps_text({"type": "progress", "job": snapshot.model_dump()})
+            )
+    except WebSocketDisconnect:
+        return
+
+    if conn.closed:
+        return  # closed by the server on shutdown
+    await websocket.close()
@@ -1,43 +1,86 @@
 import json
 import uuid
+from typing import List, Optional
 from fastapi import UploadFile, HTTPException
 
-from app.models.story import Character, StoryResponse
-from app.services.file_service import extract_text
+from app.models.story import Character, StoryResponse, SegmentResponse
+from app.services.document_service import resolve_material
 from app.services.ai_service import generate_story
-from app.services.session_service import create_session
+from app.services.session_service import Session, create_session
+from app.services.stream_service import start_speculative_stream
+from app.services.segment_service import next_segment
 from app.services.db_service import save_story_to_db
 
 
 # ─── Shared helper ────────────────────────────────────────────────────────────
 
-def _parse_character(character_json: str) -> Character:
+def parse_characters(character_json: str, many: bool = False) -> List[Character]:
+    """
+    Parses the `character` form field: one character object or, with
+    many=True, also a non-empty list of them. Raises HTTPException 422.
+    """
     try:
-        return Character(**json.loads(character_json))
+        parsed = json.loads(character_json)
+        if many and isinstance(parsed, list):
+            if not parsed:
+                raise ValueError("expected an object or a non-empty list of objects")
+            return [Character(**item) for item in parsed]
+        return [Character(**parsed)]
     except (json.JSONDecodeError, TypeError, ValueError) as exc:
         raise HTTPException(status_code=422, detail=f"Invalid 'character' JSON: {exc}")
 
 
+def _parse_character(character_json: str) -> Character:
+    return parse_characters(character_json)[0]
+
+
 # ─── REST: upload + start → returns session_id ───────────────────────────────
 
 async def start_story_controller(
     character_json: str,
-    file: UploadFile,
+    file: Optional[UploadFile],
     prompt: str,
     user_name: str = "",
+    owner_id: str = "",
+    file_sha256: str = "",
+    file_size: Optional[int] = None,
+    speculative: bool = False,
+    segmented: bool = False,
 ) -> dict:
     """
     Accepts the file upload via REST, extracts text, stores everything in
     the session store, and returns a session_id for the WebSocket to use.
+
+    The file may be replaced by its SHA-256 (and size) if the server has seen
+    the same bytes before; otherwise a 404 "upload_required" asks for the file.
+
+    With `speculative`, generation starts immediately and buffers in the
+    background, saving a client round trip plus the WebSocket handshake.
+
+    With `segmented`, the WebSocket streams only the first segment (up to the
+    first quiz); the rest is fetched through next_segment_controller.
     """
     character = _parse_character(character_json)
 
-    file_content = await extract_text(file)
+    file_content = await resolve_material(file, file_sha256, file_size)
     if not file_content.strip():
         raise HTTPException(status_code=400, detail="Uploaded file appears to be empty or unreadable.")
 
     session_id = str(uuid.uuid4())
-    await create_session(session_id, character, file_content, prompt or "", user_name)
+    if speculative:
+        session = Session(
+            character=character,
+            file_content=file_content,
+            prompt=prompt or "",
+            user_name=user_name,
+            owner_id=owner_id,
+            segmented=segmented,
+        )
+        await start_speculative_stream(session_id, session)
+    else:
+        await create_session(
+            session_id, character, file_content, prompt or "", user_name, owner_id, segmented
+        )
 
     return {"session_id": session_id}
 
@@ -46,16 +89,20 @@ async def start_story_controller(
 
 async def generate_story_controller(
     character_json: str,
-    file: UploadFile,
+    file: Optional[UploadFile],
     prompt: str,
     user_name: str = "",
+    owner_id: str = "",
+    file_sha256: str = "",
+    file_size: Optional[int] = None,
 ) -> StoryResponse:
     """
     Full blocking REST endpoint — uploads file and returns the complete story.
+    Accepts a known file's SHA-256 instead of the file, like /start.
     """
     character = _parse_character(character_json)
 
-    file_content = await extract_text(file)
+    file_content = await resolve_material(file, file_sha256, file_size)
     if not file_content.strip():
         raise HTTPException(status_code=400, detail="Uploaded file appears to be empty or unreadable.")
 
@@ -69,10 +116,17 @@ async def generate_story_controller(
     # Save to MongoDB (Optional)
     try:
         story_dict = story_response.model_dump(exclude_none=True)
-        inserted_id = await save_story_to_db(story_dict)
+        inserted_id = await save_story_to_db(story_dict, owner_id)
         if inserted_id:
             story_response.id = inserted_id
     except Exception as e:
         print(f"Warning: Unexpected error during story save: {e}")
 
     return story_response
+
+
+# ─── REST: next segment of a segmented story ──────────────────────────────────
+
+async def next_segment_controller(session_id: str, answer: str) -> SegmentResponse:
+    """Returns the segment after the player's current quiz (usually prefetched)."""
+    return SegmentResponse(**await next_segment(session_id, answer))
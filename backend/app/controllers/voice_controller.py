@@ -1,13 +1,29 @@
+import asyncio
 import json
 from fastapi import WebSocket, WebSocketDisconnect
-from app.services.sarvam_service import stream_voice_from_sarvam
+from app.config import TTS_MAX_CONCURRENCY
+from app.services.connection_service import Connection, connections
+from app.services.sarvam_service import stream_voice_pipeline
 
 async def stream_voice_ws_controller(websocket: WebSocket) -> None:
     """
     WebSocket controller for streaming voice.
     Receives text from the client, calls Sarvam AI, and streams back MP3 bytes.
+
+    Each line is split into sentences that are synthesised concurrently (at
+    most TTS_MAX_CONCURRENCY per connection) and streamed back in order.
+
+    The server sends {"type": "ping"} every WS_PING_INTERVAL; clients answer
+    {"type": "pong"}. Sockets that send no text for WS_IDLE_TIMEOUT are closed.
     """
-    await websocket.accept()
+    async with connections.session(websocket, "voice", heartbeat=True) as conn:
+        if conn is not None:
+            await _serve_voice(conn)
+
+
+async def _serve_voice(conn: Connection) -> None:
+    websocket = conn.websocket
+    limiter = asyncio.Semaphore(TTS_MAX_CONCURRENCY)
     
     try:
         while True:
@@ -18,20 +34,26 @@ async def stream_voice_ws_controller(websocket: WebSocket) -> None:
                 # Expecting either plain text or JSON with "text" field
                 try:
                     parsed = json.loads(data)
+                    if parsed.get("type") == "pong":
+                        conn.pong()
+                        continue
                     text = parsed.get("text", "")
                 except json.JSONDecodeError:
                     text = data
                 
+                conn.touch()
                 if not text.strip():
                     continue
                     
                 # Stream audio back (binary frames)
-                async for chunk in stream_voice_from_sarvam(text):
-                    await websocket.send_bytes(chunk)
+                async for chunk in stream_voice_pipeline(text, limiter):
+                    await conn.send_bytes(chunk)
                     
             except Exception as e:
+                if conn.closed:
+                    return  # closed by the server (idle, heartbeat or shutdown)
                 # Send error as text frame
-                await websocket.send_text(json.dumps({"type": "error", "error": str(e)}))
+                await conn.send_text(json.dumps({"type": "error", "error": str(e)}))
                 
     except WebSocketDisconnect:
         pass
@@ -1,81 +1,84 @@
-import json
 from fastapi import WebSocket, WebSocketDisconnect
 
-from app.services.session_service import get_and_delete_session
-from app.services.ai_service import generate_story_stream
-from app.services.db_service import save_story_to_db
-from app.models.story import StoryResponse
+from app.services.connection_service import (
+    CLOSE_NORMAL,
+    CLOSE_SERVICE_RESTART,
+    Connection,
+    connections,
+    until_handoff,
+)
+from app.services.stream_service import attach_stream, utf16_len
+from app.services.wire_service import StoryWireEncoder, negotiate_encoder
 
 
-async def stream_story_ws_controller(websocket: WebSocket, session_id: str) -> None:
+async def stream_story_ws_controller(websocket: WebSocket, session_id: str, offset: int = 0) -> None:
     """
     WebSocket controller for streaming story generation.
 
-    Protocol
+    Protocol (v1, the default — see wire_service for the compact v2)
     ────────
     1. Client connects to  ws://.../api/v1/story/stream/{session_id}
-    2. Server immediately starts streaming AI tokens:
+    2. Server streams AI tokens (replaying anything buffered past `offset`):
           {"type": "chunk",  "content": "<token>"}
     3. After all tokens arrive, server sends the fully parsed story:
           {"type": "done",   "story": { <StoryResponse> }}
     4. On any error:
           {"type": "error",  "detail": "<message>"}
+
+    Generation runs independently of this socket. If the client drops, it can
+    reconnect with ?offset=<UTF-16 length received so far> and continue; the
+    story is persisted even if nobody is attached when it finishes.
+
+    On server shutdown the stream is allowed to finish; if it can't within
+    the drain window the client gets {"type": "reconnect", "offset": N}.
     """
-    await websocket.accept()
+    encoder = negotiate_encoder(websocket.scope.get("subprotocols", []))
+    async with connections.session(websocket, "story", encoder.subprotocol, graceful=True) as conn:
+        if conn is not None:
+            await _stream_story(conn, encoder, session_id, offset)
 
-    # ── 1. Look up and consume the session ───────────────────────────────────
-    session = await get_and_delete_session(session_id)
-    if session is None:
+
+async def _stream_story(conn: Connection, encoder: StoryWireEncoder, session_id: str, offset: int) -> None:
+    # ── 1. Attach to the session's stream (starting it on first connect) ────
+    stream = await attach_stream(session_id)
+    if stream is None:
         await _send_error(
-            websocket,
+            conn,
+            encoder,
             f"Session '{session_id}' not found or has expired. "
             "Please POST to /api/v1/story/start to create a new session."
         )
         return
 
-    # ── 2. Stream from OpenRouter, forwarding each chunk to the client ────────
-    accumulated = ""
+    # ── 2. Replay from `offset`, then follow live output ──────────────────────
     try:
-        async for chunk in generate_story_stream(
-            character=session.character,
-            file_content=session.file_content,
-            prompt=session.prompt,
-            user_name=session.user_name,
-        ):
-            accumulated += chunk
-            await websocket.send_text(
-                json.dumps({"type": "chunk", "content": chunk})
-            )
-    except RuntimeError as exc:
-        await _send_error(websocket, str(exc))
-        return
-    except WebSocketDisconnect:
-        return  # Client disconnected mid-stream — nothing to do
+        async for chunk in until_handoff(conn, stream.follow(offset)):
+            await encoder.send_chunk(conn, chunk)
+            offset += utf16_len(chunk)
 
-    # ── 3. Parse the full accumulated JSON and send the "done" event ──────────
-    try:
-        story_dict = json.loads(accumulated)
-        inserted_id = await save_story_to_db(story_dict)
-        story_dict["id"] = inserted_id
-        story = StoryResponse(**story_dict)
-        await websocket.send_text(
-            json.dumps({"type": "done", "story": story.model_dump()})
-        )
-    except (json.JSONDecodeError, ValueError, TypeError) as exc:
-        await _send_error(
-            websocket,
-            f"Failed to parse completed story JSON: {exc}. "
-            f"Raw output (first 500 chars): {accumulated[:500]}"
-        )
-        return
+        if conn.handoff.is_set():
+            if conn.closed:
+                return  # reaped as idle; the client reconnects on demand
+            await encoder.send_reconnect(conn, offset)
+            await conn.close(CLOSE_SERVICE_RESTART)
+            return
+
+        # ── 3. Send the "done" event (or the generation error) ────────────────
+        if stream.error is not None:
+            await _send_error(conn, encoder, stream.error)
+            return
+
+        await encoder.send_done(conn, stream.story, stream.digest, stream.rewritten)
+    except WebSocketDisconnect:
+        return  # Client left — generation carries on in the background
 
     # ── 4. Close cleanly ──────────────────────────────────────────────────────
-    await websocket.close()
+    await conn.close(CLOSE_NORMAL)
 
 
-async def _send_error(websocket: WebSocket, detail: str) -> None:
+async def _send_error(conn: Connection, encoder: StoryWireEncoder, detail: str) -> None:
     try:
-        await websocket.send_text(json.dumps({"type": "error", "detail": detail}))
-        await websocket.close(code=1011)
+        await encoder.send_error(conn, detail)
+        await conn.close(1011)
     except Exception:
         pass
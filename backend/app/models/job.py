@@ -0,0 +1,28 @@
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+
+
+# ─── Batch generation jobs ────────────────────────────────────────────────────
+
+ItemState = Literal["queued", "running", "done", "failed"]
+JobState = Literal["queued", "running", "done"]
+
+
+class JobItemStatus(BaseModel):
+    index: int
+    filename: str
+    character: str
+    status: ItemState = "queued"
+    story_id: Optional[str] = None
+    title: Optional[str] = None
+    error: Optional[str] = None
+    deduplicated: bool = False  # result shared with an identical input
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: JobState
+    total: int
+    completed: int
+    failed: int
+    items: List[JobItemStatus]
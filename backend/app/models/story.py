@@ -1,4 +1,5 @@
 from pydantic import BaseModel, field_validator
+from datetime import datetime
 from typing import List, Optional, Union
 
 
@@ -62,3 +63,30 @@ class StoryResponse(BaseModel):
     title: str
     summary: str
     frames: List[Frame]
+
+
+# ─── Library listing ──────────────────────────────────────────────────────────
+
+class StorySummary(BaseModel):
+    id: str
+    title: str
+    summary: str
+    frame_count: int
+    created_at: Optional[datetime] = None
+
+
+class StoryPage(BaseModel):
+    items: List[StorySummary]
+    next_cursor: Optional[str] = None
+
+
+# ─── Segmented stories ────────────────────────────────────────────────────────
+
+class SegmentRequest(BaseModel):
+    answer: str = ""  # text of the option the player chose at the last quiz
+
+
+class SegmentResponse(BaseModel):
+    frames: List[Frame]
+    complete: bool
+    story_id: Optional[str] = None  # set once the final segment is saved
@@ -0,0 +1,47 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import RedirectResponse
+
+from app.config import AVATAR_VARIANTS
+from app.services.avatar_service import is_avatar_hash, read_avatar
+
+router = APIRouter(prefix="/avatar", tags=["Avatar"])
+
+# Avatar URLs are content-addressed: the bytes behind a URL never change.
+_IMMUTABLE = "public, max-age=31536000, immutable"
+
+VariantName = Literal[tuple(AVATAR_VARIANTS)]
+
+
+async def _serve(request: Request, sha256: str, variant: Optional[str]) -> Response:
+    if not is_avatar_hash(sha256):
+        raise HTTPException(status_code=404, detail="Avatar not found.")
+
+    etag = f'"{sha256}.{variant}"' if variant else f'"{sha256}"'
+    headers = {"Cache-Control": _IMMUTABLE, "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    avatar = await read_avatar(sha256, variant)
+    if avatar is None:
+        if variant and await read_avatar(sha256) is not None:
+            # No image library to resize with — fall back to the original
+            return RedirectResponse(request.url_for("get_avatar", sha256=sha256), status_code=307)
+        raise HTTPException(status_code=404, detail="Avatar not found.")
+
+    data, content_type = avatar
+    headers["X-Content-Type-Options"] = "nosniff"
+    return Response(content=data, media_type=content_type, headers=headers)
+
+
+@router.get("/{sha256}", name="get_avatar")
+async def get_avatar(request: Request, sha256: str) -> Response:
+    """Original avatar image, cached immutably by content hash."""
+    return await _serve(request, sha256, None)
+
+
+@router.get("/{sha256}/{variant}", name="get_avatar_variant")
+async def get_avatar_variant(request: Request, sha256: str, variant: VariantName) -> Response:
+    """Resized WebP variant of an avatar (see AVATAR_VARIANTS)."""
+    return await _serve(request, sha256, variant)
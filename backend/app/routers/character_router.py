@@ -1,7 +1,8 @@
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Request
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 
+from app.services.avatar_service import externalise_avatar, present_avatar
 from app.services.db_service import save_character_to_db, get_characters_by_ids
 
 router = APIRouter(prefix="/character", tags=["Character"])
@@ -16,17 +17,23 @@ class CharacterCreate(BaseModel):
 
 @router.post("")
 async def create_character(character: CharacterCreate) -> Dict[str, str]:
-    """Save a character to the database and return its ID."""
-    char_dict = character.model_dump()
+    """
+    Save a character to the database and return its ID. A data-URI avatar is
+    moved to the avatar store; the document keeps only `avatar_sha256`.
+    """
+    char_dict = await externalise_avatar(character.model_dump())
     char_id = await save_character_to_db(char_dict)
     if not char_id:
         raise HTTPException(status_code=500, detail="Failed to save character to database.")
     return {"id": char_id}
 
 @router.post("/batch")
-async def get_characters(ids: List[str] = Body(...)) -> List[Dict[str, Any]]:
-    """Retrieve multiple characters by a list of IDs."""
+async def get_characters(request: Request, ids: List[str] = Body(...)) -> List[Dict[str, Any]]:
+    """
+    Retrieve multiple characters by a list of IDs. Stored avatars are returned
+    as URLs: `avatar` (original) and `avatarVariants` (resized).
+    """
     if not ids:
         return []
     characters = await get_characters_by_ids(ids)
-    return characters
+    return [await present_avatar(char, request.url_for) for char in characters]
@@ -1,8 +1,17 @@
-from fastapi import APIRouter, File, Form, UploadFile, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException, Query
 
-from app.models.story import StoryResponse
-from app.controllers.story_controller import start_story_controller, generate_story_controller
-from app.services.db_service import get_story_from_db
+from app.models.story import StoryResponse, StoryPage, SegmentRequest, SegmentResponse
+from app.models.job import JobStatus
+from app.controllers.story_controller import (
+    start_story_controller,
+    generate_story_controller,
+    next_segment_controller,
+)
+from app.controllers.job_controller import submit_job_controller, get_job_controller
+from app.services.db_service import STORY_SCHEMA_VERSION, get_story_from_db, list_stories_from_db
+from app.services.json_service import FastJSONResponse, story_payload
+from app.config import STORY_PAGE_DEFAULT, STORY_PAGE_MAX, SPECULATIVE_START_DEFAULT
 
 router = APIRouter(prefix="/story", tags=["Story"])
 
@@ -18,7 +27,10 @@ async def start_story_route(
         ...,
         description='JSON string: {"name": "...", "description": "...", "tone": "..."}'
     ),
-    file: UploadFile = File(..., description="Study material (.pdf or .txt)"),
+    file: Optional[UploadFile] = File(
+        default=None,
+        description="Study material (.pdf or .txt). May be omitted when file_sha256 is known to the server",
+    ),
     prompt: str = Form(
         default="",
         description="Optional creative direction",
@@ -27,6 +39,26 @@ async def start_story_route(
         default="",
         description="Optional user name",
     ),
+    owner_id: str = Form(
+        default="",
+        description="Optional stable owner id, used to list the owner's stories",
+    ),
+    file_sha256: str = Form(
+        default="",
+        description="SHA-256 (hex) of the file — send instead of the file to skip the upload",
+    ),
+    file_size: Optional[int] = Form(
+        default=None,
+        description="Size of the file in bytes, checked alongside file_sha256",
+    ),
+    speculative: bool = Form(
+        default=SPECULATIVE_START_DEFAULT,
+        description="Start generating right away instead of waiting for the WebSocket",
+    ),
+    segmented: bool = Form(
+        default=False,
+        description="Generate the story a quiz at a time; fetch later parts from /story/segments/{session_id}/next",
+    ),
 ) -> dict:
     """
     **POST /story/start** — Step 1 of the streaming workflow.
@@ -38,15 +70,50 @@ async def start_story_route(
     to receive the streamed story.
 
     Session expires after **5 minutes** if unused.
+
+    **Upload by hash:** omit `file` and send `file_sha256` (+ `file_size`).
+    If the server already holds that document the session is created at
+    once; otherwise it answers `404` with `upload_required` and the client
+    retries with the file attached.
+
+    **Speculative start:** with `speculative=true` the AI call begins now and
+    its output is buffered until the WebSocket connects (which replays it).
+    Connect within 30 seconds or the generation is aborted.
+
+    **Segmented:** with `segmented=true` the WebSocket streams only the first
+    segment (title, summary, frames up to the first quiz). Fetch each later
+    segment with `POST /story/segments/{session_id}/next`.
     """
     return await start_story_controller(
         character_json=character,
         file=file,
         prompt=prompt,
         user_name=user_name,
+        owner_id=owner_id,
+        file_sha256=file_sha256,
+        file_size=file_size,
+        speculative=speculative,
+        segmented=segmented,
     )
 
 
+# ─── Segmented stories — next part on demand ──────────────────────────────────
+
+@router.post(
+    "/segments/{session_id}/next",
+    response_model=SegmentResponse,
+    summary="Get the next segment of a segmented story",
+)
+async def next_segment_route(session_id: str, body: SegmentRequest) -> SegmentResponse:
+    """
+    Call when the player answers the quiz that ends the current segment,
+    passing the chosen option's text as `answer`. The segment is usually
+    prefetched already. `complete: true` marks the last one, and `story_id`
+    is then the saved story's id.
+    """
+    return await next_segment_controller(session_id, body.answer)
+
+
 # ─── (Optional) Blocking REST endpoint — returns the full story at once ───────
 
 @router.post(
@@ -59,7 +126,10 @@ async def generate_story_route(
         ...,
         description='JSON string: {"name": "...", "description": "...", "tone": "..."}'
     ),
-    file: UploadFile = File(..., description="Study material (.pdf or .txt)"),
+    file: Optional[UploadFile] = File(
+        default=None,
+        description="Study material (.pdf or .txt). May be omitted when file_sha256 is known to the server",
+    ),
     prompt: str = Form(
         default="",
         description="Optional creative direction",
@@ -68,18 +138,103 @@ async def generate_story_route(
         default="",
         description="Optional user name",
     ),
+    owner_id: str = Form(
+        default="",
+        description="Optional stable owner id, used to list the owner's stories",
+    ),
+    file_sha256: str = Form(
+        default="",
+        description="SHA-256 (hex) of the file — send instead of the file to skip the upload",
+    ),
+    file_size: Optional[int] = Form(
+        default=None,
+        description="Size of the file in bytes, checked alongside file_sha256",
+    ),
 ) -> StoryResponse:
     """
     **POST /story/generate** — Single blocking request, returns the full story.
 
     Use `/start` + WebSocket instead for a streaming experience.
     """
-    return await generate_story_controller(
+    story = await generate_story_controller(
         character_json=character,
         file=file,
         prompt=prompt,
         user_name=user_name,
+        owner_id=owner_id,
+        file_sha256=file_sha256,
+        file_size=file_size,
     )
+    # Already validated when parsed from the model output — skip response_model
+    return FastJSONResponse(story.model_dump_json())
+
+
+# ─── Batch jobs — many stories per request, generated in the background ───────
+
+@router.post(
+    "/jobs",
+    status_code=202,
+    summary="Queue a batch of story generations and get a job_id",
+)
+async def submit_job_route(
+    character: str = Form(
+        ...,
+        description='JSON object, or a list of objects (one per file): {"name": "...", "description": "...", "tone": "..."}'
+    ),
+    files: List[UploadFile] = File(..., description="Study materials (.pdf or .txt), one story per file"),
+    prompt: str = Form(
+        default="",
+        description="Optional creative direction, applied to every story",
+    ),
+    user_name: str = Form(
+        default="",
+        description="Optional user name",
+    ),
+    owner_id: str = Form(
+        default="",
+        description="Optional stable owner id, used to list the owner's stories",
+    ),
+) -> dict:
+    """
+    **POST /story/jobs** — Returns immediately with a `job_id`.
+
+    Poll `GET /story/jobs/{job_id}` or subscribe to
+    `ws://localhost:8000/api/v1/story/jobs/{job_id}/stream` for progress.
+    Each finished item carries the `story_id` to load via `GET /story/{story_id}`.
+    """
+    return await submit_job_controller(
+        character_json=character,
+        files=files,
+        prompt=prompt,
+        user_name=user_name,
+        owner_id=owner_id,
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job_route(job_id: str):
+    """Current progress of a batch job."""
+    snapshot = await get_job_controller(job_id)
+    return FastJSONResponse(snapshot.model_dump_json())
+
+
+# ─── Library — paginated, summaries only ──────────────────────────────────────
+
+@router.get("", response_model=StoryPage)
+async def list_stories_route(
+    owner_id: str = Query(default="", description="Only list stories saved with this owner id"),
+    cursor: str = Query(default="", description="next_cursor from the previous page"),
+    limit: int = Query(default=STORY_PAGE_DEFAULT, ge=1, le=STORY_PAGE_MAX),
+):
+    """
+    List stories newest first, without their frames. Pass `next_cursor` back
+    as `cursor` to fetch the following page; it is null on the last page.
+    """
+    try:
+        items, next_cursor = await list_stories_from_db(owner_id, cursor or None, limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return FastJSONResponse({"items": items, "next_cursor": next_cursor})
 
 
 # ─── Fetch specifically by ID ───────────────────────────────────
@@ -90,5 +245,9 @@ async def get_story_by_id(story_id: str):
     story_dict = await get_story_from_db(story_id)
     if not story_dict:
         raise HTTPException(status_code=404, detail="Story not found")
-    return StoryResponse(**story_dict)
+    if story_dict["schema_version"] >= STORY_SCHEMA_VERSION:
+        # Validated as a StoryResponse before it was saved — skip re-validation
+        return FastJSONResponse(story_payload(story_dict))
+    # Older documents may hold raw model output (string ids, stray keys)
+    return FastJSONResponse(StoryResponse.model_validate(story_dict).model_dump_json())
     
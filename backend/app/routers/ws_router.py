@@ -1,25 +1,53 @@
-from fastapi import APIRouter, WebSocket
+from fastapi import APIRouter, WebSocket, Query
 
 from app.controllers.ws_controller import stream_story_ws_controller
 from app.controllers.voice_controller import stream_voice_ws_controller
+from app.controllers.job_controller import job_progress_ws_controller
 
 router = APIRouter(tags=["WebSocket"])
 
 
 @router.websocket("/story/stream/{session_id}")
-async def story_stream_websocket(websocket: WebSocket, session_id: str):
+async def story_stream_websocket(
+    websocket: WebSocket,
+    session_id: str,
+    offset: int = Query(default=0, ge=0, description="UTF-16 length (JavaScript string length) of the chunk content already received; replay resumes from here"),
+):
     """
     **WS /api/v1/story/stream/{session_id}** — Step 2 of the streaming workflow.
 
     1. First POST to `/api/v1/story/start` to upload the file and receive a `session_id`.
     2. Connect here with that `session_id` — streaming begins immediately.
+    3. If the connection drops, reconnect with `?offset=N` to replay the rest
+       and keep following live output. N is the total JavaScript `length`
+       (UTF-16 code units) of the chunk content received so far.
 
     Messages received:
     - `{"type": "chunk",  "content": "..."}` — streaming token from AI
     - `{"type": "done",   "story": {...}}`    — final parsed StoryResponse
     - `{"type": "error",  "detail": "..."}`   — on failure
+
+    Offer the `paperplayground.v2.json` or `paperplayground.v2.msgpack`
+    subprotocol for the compact v2 encoding, where `done` carries only the
+    story id and a SHA-256 digest of the streamed text.
+    """
+    await stream_story_ws_controller(websocket, session_id, offset)
+
+
+@router.websocket("/story/jobs/{job_id}/stream")
+async def job_progress_websocket(websocket: WebSocket, job_id: str):
+    """
+    **WS /api/v1/story/jobs/{job_id}/stream**
+
+    Progress of a batch job created with `POST /api/v1/story/jobs`.
+
+    Messages received:
+    - `{"type": "progress", "job": {...}}` — JobStatus, sent on every change
+    - `{"type": "error",    "detail": "..."}` — unknown or expired job
+
+    The socket closes once every item is done or failed.
     """
-    await stream_story_ws_controller(websocket, session_id)
+    await job_progress_ws_controller(websocket, job_id)
 
 
 @router.websocket("/voice/stream")
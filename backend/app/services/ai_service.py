@@ -1,10 +1,24 @@
 import json
+import time
 import httpx
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional
 from fastapi import HTTPException
 
-from app.config import OPENROUTER_API_KEY, OPENROUTER_BASE_URL, OPENROUTER_MODEL
+from app.config import (
+    OPENROUTER_API_KEY,
+    OPENROUTER_BASE_URL,
+    OPENROUTER_MODEL,
+    MAX_CONTINUATIONS,
+    OPENROUTER_RETRY_DEADLINE,
+)
 from app.models.story import Character, StoryResponse
+from app.services.json_service import loads
+from app.services.resilience_service import (
+    CircuitOpenError,
+    openrouter_breaker,
+    retry_after_seconds,
+    send_with_retry,
+)
 
 # ─── System prompt template ───────────────────────────────────────────────────
 
@@ -83,6 +97,72 @@ OUTPUT RULES
 - If you generate more than 50 frames, your output is considered invalid.
 """
 
+_CONTINUE_PROMPT = """Your previous reply was cut off by the output limit.
+Continue the JSON exactly from the last character you produced.
+Do NOT repeat anything already written, do NOT restart the object, and do NOT add markdown or commentary.
+If you are close to 50 frames, finish the current frame and close the story with "nextFrameId": null."""
+
+_SEGMENT_SYSTEM_PROMPT = """You are an educational visual novel engine that writes a story ONE SEGMENT AT A TIME.
+
+You MUST strictly follow the provided JSON schema.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+SEGMENT RULES
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+- A segment is 4-10 frames. The whole story must not exceed 50 frames.
+- The first segment opens the story; later segments continue it seamlessly.
+- A segment that is not the last one MUST end with a quiz (question) frame.
+  Every option of that quiz must point to the frame id right after the quiz;
+  that frame belongs to the NEXT segment and will be written later.
+- A later segment MUST begin with the explanation frame for the previous quiz:
+  reveal the correct answer and, if the learner's answer is given, react to it.
+  When told that the explanation is written separately, skip it and continue
+  teaching from the given start id.
+- When the material's 3-5 core ideas have been taught, finish the story:
+  set "complete": true and give the final frame "nextFrameId": null.
+- The character teaches the user directly using the provided personality and tone.
+- Each quiz has 2-3 options and only ONE correct answer.
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+JSON SCHEMA (follow exactly)
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+{
+  "title": "<first segment only: short engaging story title>",
+  "summary": "<first segment only: what the character will teach>",
+  "complete": <true if this segment ends the story, else false>,
+  "frames": [
+    {
+      "id": <integer, continuing from the given start id>,
+      "speaker": "<character name>",
+      "text": "<dialogue — teach a concept, ask a quiz, or explain its answer>",
+      "emotion": "<one of: neutral, happy, sad, surprised, angry, thinking, excited>",
+      "options": [ { "text": "<option>", "nextFrameId": <integer> } ],   // quiz frames only
+      "nextFrameId": <id of next frame as integer, or null for quiz and final frames>
+    }
+  ]
+}
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+OUTPUT RULES
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+- Output ONLY valid JSON. No markdown. No comments. No additional text.
+- Frame ids are sequential integers starting at the given start id.
+"""
+
+
+_EXPLANATION_SYSTEM_PROMPT = """You are an educational visual novel engine. Write ONE frame: the character's
+reaction to the learner's answer to the last quiz.
+
+- Reveal the correct answer and briefly explain why.
+- If the learner's answer is given, react to it: praise a correct answer, gently correct a wrong one.
+- Stay in character, using the provided personality and tone.
+
+Output ONLY valid JSON. No markdown. No comments. No additional text.
+{"frames": [{"id": <given id>, "speaker": "<character name>", "text": "<dialogue>",
+  "emotion": "<one of: neutral, happy, sad, surprised, angry, thinking, excited>",
+  "options": null, "nextFrameId": <given next id>}]}
+"""
+
 
 # ─── Shared helpers ──────────────────────────────────────────────────────────────
 
@@ -101,6 +181,83 @@ User's creative direction: {prompt or 'None provided, use your creativity.'}{use
 Generate the interactive visual novel story in the JSON format described."""
 
 
+# Covered frames are summarised into the segment prompt up to this many chars
+_COVERED_CONTEXT_CHARS = 3000
+
+
+def _build_segment_message(
+    character: Character,
+    file_content: str,
+    prompt: str,
+    user_name: str,
+    segment_index: int,
+    start_id: int,
+    covered: list[dict],
+    answers: list[str],
+    final: bool,
+    explain_previous: bool = True,
+) -> str:
+    base = _build_user_message(character, file_content, prompt, user_name)
+    base = base.rsplit("\n\n", 1)[0]  # drop the whole-story instruction
+
+    if segment_index == 0:
+        return f"""{base}
+
+Write the FIRST segment (include "title" and "summary"). Start frame ids at 1."""
+
+    recap = "\n".join(f"{f['id']}. {f['text']}" for f in covered)[-_COVERED_CONTEXT_CHARS:]
+    answer_lines = "\n".join(f"- Quiz {i + 1}: {a or '(no answer given)'}" for i, a in enumerate(answers))
+    ending = (
+        "This MUST be the final segment: set \"complete\": true."
+        if final else
+        "End with a quiz unless the story is complete."
+    )
+    explanation = (
+        ""
+        if explain_previous else
+        f"The explanation of the last quiz (frame {start_id - 1}) is written separately: do NOT write it.\n"
+    )
+    return f"""{base}
+
+Story so far (frame id. text):
+{recap}
+
+Learner's quiz answers so far:
+{answer_lines or '- none yet'}
+
+Write segment {segment_index + 1} (omit "title" and "summary"). Start frame ids at {start_id}.
+{explanation}{ending}"""
+
+
+def _build_explanation_message(
+    character: Character,
+    user_name: str,
+    covered: list[dict],
+    answer: str,
+    frame_id: int,
+    next_id: Optional[int],
+) -> str:
+    recap = "\n".join(f"{f['id']}. {f['text']}" for f in covered)[-_COVERED_CONTEXT_CHARS:]
+    quiz = covered[-1]
+    options = "\n".join(f"- {o['text']}" for o in quiz.get("options") or [])
+    user_context = f"\nUser's name: {user_name}" if user_name else ""
+    return f"""Character:
+- Name: {character.name}
+- Description: {character.description}
+- Tone: {character.tone}{user_context}
+
+Story so far (frame id. text):
+{recap}
+
+Quiz: {quiz['text']}
+Options:
+{options}
+
+Learner's answer: {answer or '(no answer given)'}
+
+Write the explanation frame with id {frame_id} and "nextFrameId": {json.dumps(next_id)}."""
+
+
 def _common_headers() -> dict:
     return {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
@@ -110,6 +267,196 @@ def _common_headers() -> dict:
     }
 
 
+def _build_payload(messages: list[dict], partial: str, stream: bool) -> dict:
+    """
+    Builds the chat-completion payload. When `partial` is non-empty this is a
+    continuation request: the truncated output is replayed as an assistant
+    turn and JSON mode is dropped, since it would force a brand new object.
+    """
+    payload = {
+        "model": OPENROUTER_MODEL,
+        "messages": messages,
+        "temperature": 0.8,
+        "stream": stream,
+    }
+    if partial:
+        payload["messages"] = messages + [
+            {"role": "assistant", "content": partial},
+            {"role": "user", "content": _CONTINUE_PROMPT},
+        ]
+        payload["temperature"] = 0.2
+    else:
+        payload["response_format"] = {"type": "json_object"}
+    return payload
+
+
+# ─── Truncation handling ──────────────────────────────────────────────────────
+
+# A continuation that repeats less than this many characters of the previous
+# tail is treated as genuinely new output rather than an overlap.
+_MIN_OVERLAP_CHARS = 16
+
+
+def _strip_fences(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+    if text.endswith("```"):
+        text = text[:-3]
+    return text
+
+
+def _is_balanced_json(text: str) -> bool:
+    """True if every brace/bracket outside of strings is closed."""
+    depth = 0
+    in_string = escaped = False
+    seen_open = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+            seen_open = True
+        elif ch in "}]":
+            depth -= 1
+    return seen_open and depth == 0 and not in_string
+
+
+def _trim_overlap(partial: str, continuation: str) -> str:
+    """Drops any prefix of `continuation` that repeats the tail of `partial`."""
+    if continuation.startswith("```"):
+        continuation = continuation.split("\n", 1)[1] if "\n" in continuation else ""
+    tail = partial[-500:]
+    for size in range(min(len(tail), len(continuation)), _MIN_OVERLAP_CHARS - 1, -1):
+        if tail.endswith(continuation[:size]):
+            return continuation[size:]
+    return continuation
+
+
+def _needs_continuation(text: str, finish_reason: Optional[str]) -> bool:
+    return finish_reason == "length" or not _is_balanced_json(text)
+
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _cut_points(text: str) -> list[tuple[int, str]]:
+    """
+    (offset, closers) for each place `text` can be cut without leaving a
+    partial value behind: before a comma or after a closing bracket, in the
+    root object or directly inside one of its arrays (i.e. between frames,
+    never inside one). `closers` closes every container still open there.
+    """
+    points = []
+    stack: list[str] = []
+    in_string = escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            if not stack:
+                break
+            stack.pop()
+            if 0 < len(stack) <= 2:
+                points.append((i + 1, "".join(_CLOSERS[c] for c in reversed(stack))))
+        elif ch == "," and 0 < len(stack) <= 2:
+            points.append((i, "".join(_CLOSERS[c] for c in reversed(stack))))
+    if stack and not in_string and len(stack) <= 2:
+        points.append((len(text), "".join(_CLOSERS[c] for c in reversed(stack))))
+    return points
+
+
+def _close_story(story_dict: dict) -> dict:
+    """
+    Makes a salvaged frame list end cleanly: no dangling quiz, last frame →
+    null, and no link to a frame that was cut off (it goes to the following
+    frame, or null at the end).
+    """
+    frames = [f for f in story_dict.get("frames") or [] if isinstance(f, dict)]
+    while frames and frames[-1].get("options"):
+        frames.pop()  # a quiz without its explanation frame is useless
+    kept = {str(f.get("id")) for f in frames}
+    for index, frame in enumerate(frames):
+        following = frames[index + 1].get("id") if index + 1 < len(frames) else None
+        if frame.get("nextFrameId") is not None and str(frame["nextFrameId"]) not in kept:
+            frame["nextFrameId"] = following
+        for option in frame.get("options") or []:
+            if isinstance(option, dict) and str(option.get("nextFrameId")) not in kept:
+                option["nextFrameId"] = following
+    if frames:
+        frames[-1]["nextFrameId"] = None
+    story_dict["frames"] = frames
+    return story_dict
+
+
+def _salvage_story(text: str, required: tuple[str, ...]) -> Optional[dict]:
+    """
+    Returns the story built from the longest prefix of `text` that parses
+    once its open containers are closed and still has `required` keys and at
+    least one frame, or None.
+    """
+    for end, closers in reversed(_cut_points(text)):
+        try:
+            story_dict = json.loads(text[:end] + closers)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(story_dict, dict) or not isinstance(story_dict.get("frames"), list):
+            continue
+        if any(not story_dict.get(key) for key in required):
+            continue
+        story_dict = _close_story(story_dict)
+        if story_dict["frames"]:
+            return story_dict
+    return None
+
+
+def parse_story_output(text: str, required: tuple[str, ...] = ("title", "summary")) -> tuple[dict, bool, bool]:
+    """
+    Parses raw model output into a story dict.
+
+    Returns (story_dict, salvaged, exact). `salvaged` is True when the output
+    was incomplete and only the longest valid prefix of frames could be kept.
+    `exact` is True when `text` itself is the JSON document — no fences or
+    trailing text had to be stripped — so a client parsing the streamed text
+    gets the same dict. A salvaged story must still have the `required`
+    keys; segments after the first carry frames only and pass ().
+
+    Raises:
+        ValueError — if not even a partial story can be recovered.
+    """
+    stripped = text.strip()
+    cleaned = _strip_fences(text)
+    try:
+        story_dict, end = json.JSONDecoder().raw_decode(cleaned)
+        if isinstance(story_dict, dict):
+            return story_dict, False, cleaned == stripped and end == len(cleaned)
+    except json.JSONDecodeError:
+        pass
+
+    story_dict = _salvage_story(cleaned, required)
+    if story_dict is None:
+        raise ValueError("Model output is not valid JSON and no complete story could be salvaged")
+    print(f"Warning: Salvaged {len(story_dict['frames'])} frames from truncated story output")
+    return story_dict, True, False
+
+
 # ─── Non-streaming (REST) ─────────────────────────────────────────────────────
 
 async def generate_story(
@@ -120,6 +467,10 @@ async def generate_story(
 ) -> StoryResponse:
     """
     Non-streaming call to OpenRouter. Used by the REST endpoint.
+
+    Truncated completions are resumed with up to MAX_CONTINUATIONS follow-up
+    requests; if the JSON is still incomplete the longest valid prefix of
+    frames is kept.
     """
     if not OPENROUTER_API_KEY:
         raise HTTPException(
@@ -127,64 +478,160 @@ async def generate_story(
             detail="OPENROUTER_API_KEY is not configured in the environment."
         )
 
-    user_message = _build_user_message(character, file_content, prompt, user_name)
-
-    payload = {
-        "model": OPENROUTER_MODEL,
-        "messages": [
-            {"role": "system", "content": _SYSTEM_PROMPT},
-            {"role": "user", "content": user_message},
-        ],
-        "temperature": 0.8,
-        "response_format": {"type": "json_object"},
-        "stream": False,
-    }
-
+    messages = [
+        {"role": "system", "content": _SYSTEM_PROMPT},
+        {"role": "user", "content": _build_user_message(character, file_content, prompt, user_name)},
+    ]
     headers = _common_headers()
+    accumulated = ""
+    deadline = time.monotonic() + OPENROUTER_RETRY_DEADLINE  # shared by the request and its continuations
 
     async with httpx.AsyncClient(timeout=60.0) as client:
-        try:
-            response = await client.post(
-                f"{OPENROUTER_BASE_URL}/chat/completions",
-                headers=headers,
-                json=payload,
-            )
-            response.raise_for_status()
-        except httpx.HTTPStatusError as exc:
-            raise HTTPException(
-                status_code=502,
-                detail=f"OpenRouter returned an error: {exc.response.status_code} — {exc.response.text}"
-            )
-        except httpx.RequestError as exc:
-            raise HTTPException(
-                status_code=502,
-                detail=f"Could not reach OpenRouter: {exc}"
-            )
+        for _ in range(MAX_CONTINUATIONS + 1):
+            try:
+                response = await send_with_retry(
+                    client,
+                    openrouter_breaker,
+                    "POST",
+                    f"{OPENROUTER_BASE_URL}/chat/completions",
+                    deadline=deadline,
+                    headers=headers,
+                    json=_build_payload(messages, accumulated, stream=False),
+                )
+                response.raise_for_status()
+            except CircuitOpenError as exc:
+                if accumulated:
+                    break
+                raise HTTPException(
+                    status_code=503,
+                    detail=str(exc),
+                    headers={"Retry-After": str(int(exc.retry_in) + 1)},
+                )
+            except httpx.HTTPStatusError as exc:
+                if accumulated:
+                    break  # keep what we have and salvage it
+                if exc.response.status_code == 429:
+                    retry_after = retry_after_seconds(exc.response)
+                    raise HTTPException(
+                        status_code=503,
+                        detail="OpenRouter is rate limiting requests; please retry shortly.",
+                        headers={"Retry-After": str(int(retry_after or 10) + 1)},
+                    )
+                raise HTTPException(
+                    status_code=502,
+                    detail=f"OpenRouter returned an error: {exc.response.status_code} — {exc.response.text}"
+                )
+            except httpx.RequestError as exc:
+                if accumulated:
+                    break
+                raise HTTPException(
+                    status_code=502,
+                    detail=f"Could not reach OpenRouter: {exc}"
+                )
+
+            data = response.json()
+            try:
+                choice = data["choices"][0]
+                content = choice["message"]["content"] or ""
+            except (KeyError, IndexError, TypeError) as exc:
+                raise HTTPException(
+                    status_code=502,
+                    detail=f"Failed to parse AI response: {exc}. Raw: {data}"
+                )
 
-    data = response.json()
+            accumulated += _trim_overlap(accumulated, content) if accumulated else content
+            if not _needs_continuation(accumulated, choice.get("finish_reason")):
+                break
 
     try:
-        raw_content = data["choices"][0]["message"]["content"]
-        story_dict = json.loads(raw_content)
+        story_dict, _, _ = parse_story_output(accumulated)
         return StoryResponse(**story_dict)
-    except (KeyError, IndexError, json.JSONDecodeError, TypeError) as exc:
+    except (ValueError, TypeError) as exc:
         raise HTTPException(
             status_code=502,
-            detail=f"Failed to parse AI response: {exc}. Raw: {data}"
+            detail=f"Failed to parse AI response: {exc}. Raw (first 500 chars): {accumulated[:500]}"
         )
 
 
 # ─── Streaming (WebSocket) ────────────────────────────────────────────────────
 
+async def _stream_completion(
+    client: httpx.AsyncClient,
+    payload: dict,
+    result: dict,
+    deadline: float,
+) -> AsyncGenerator[str, None]:
+    """
+    Streams one chat completion, yielding content deltas. The final
+    finish_reason is written to result["finish_reason"]. Retries stop at
+    `deadline` (see send_with_retry).
+    """
+    try:
+        response = await send_with_retry(
+            client,
+            openrouter_breaker,
+            "POST",
+            f"{OPENROUTER_BASE_URL}/chat/completions",
+            deadline=deadline,
+            stream=True,
+            headers=_common_headers(),
+            json=payload,
+        )
+    except httpx.RequestError as exc:
+        raise RuntimeError(f"Could not reach OpenRouter: {exc}")
+
+    try:
+        if response.status_code != 200:
+            body = await response.aread()
+            raise RuntimeError(
+                f"OpenRouter error {response.status_code}: {body.decode(errors='replace')}"
+            )
+
+        # Parse SSE lines: each line looks like  "data: {...}"  or  "data: [DONE]"
+        async for line in response.aiter_lines():
+            line = line.strip()
+            if not line or not line.startswith("data:"):
+                continue
+
+            raw = line[len("data:"):].strip()
+
+            if raw == "[DONE]":
+                break
+
+            try:
+                choice = loads(raw)["choices"][0]
+                if choice.get("finish_reason"):
+                    result["finish_reason"] = choice["finish_reason"]
+                delta = choice.get("delta", {}).get("content", "")
+                if delta:
+                    yield delta
+            except (json.JSONDecodeError, KeyError, IndexError, AttributeError):
+                # Skip malformed SSE lines silently
+                continue
+    finally:
+        await response.aclose()
+
+
 async def generate_story_stream(
     character: Character,
     file_content: str,
     prompt: str,
     user_name: str = "",
+    resume_from: str = "",
 ) -> AsyncGenerator[str, None]:
     """
     Async generator that streams raw content token-chunks from OpenRouter.
 
+    If the completion is truncated (finish_reason "length" or unbalanced
+    JSON), continuation requests are issued and their output is yielded as a
+    seamless extension of the same stream. The caller should still parse the
+    result with parse_story_output(), which salvages a valid prefix if the
+    continuations were not enough.
+
+    `resume_from` is output already received from an earlier, closed stream
+    for the same inputs; generation continues after it and only the new text
+    is yielded.
+
     Yields:
         str — each content delta from the SSE stream.
 
@@ -194,46 +641,122 @@ async def generate_story_stream(
     if not OPENROUTER_API_KEY:
         raise RuntimeError("OPENROUTER_API_KEY is not configured in the environment.")
 
-    payload = {
-        "model": OPENROUTER_MODEL,
-        "messages": [
-            {"role": "system", "content": _SYSTEM_PROMPT},
-            {"role": "user", "content": _build_user_message(character, file_content, prompt, user_name)},
-        ],
-        "temperature": 0.8,
-        "response_format": {"type": "json_object"},
-        "stream": True,
-    }
+    messages = [
+        {"role": "system", "content": _SYSTEM_PROMPT},
+        {"role": "user", "content": _build_user_message(character, file_content, prompt, user_name)},
+    ]
+    async for delta in _stream_with_continuation(messages, resume_from):
+        yield delta
 
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        async with client.stream(
-            "POST",
-            f"{OPENROUTER_BASE_URL}/chat/completions",
-            headers=_common_headers(),
-            json=payload,
-        ) as response:
-            if response.status_code != 200:
-                body = await response.aread()
-                raise RuntimeError(
-                    f"OpenRouter error {response.status_code}: {body.decode(errors='replace')}"
-                )
 
-            # Parse SSE lines: each line looks like  "data: {...}"  or  "data: [DONE]"
-            async for line in response.aiter_lines():
-                line = line.strip()
-                if not line or not line.startswith("data:"):
-                    continue
+async def generate_segment_stream(
+    character: Character,
+    file_content: str,
+    prompt: str,
+    user_name: str,
+    segment_index: int,
+    start_id: int,
+    covered: list[dict],
+    answers: list[str],
+    final: bool = False,
+    explain_previous: bool = True,
+    resume_from: str = "",
+) -> AsyncGenerator[str, None]:
+    """
+    Streams one segment of a segmented story (see _SEGMENT_SYSTEM_PROMPT).
+
+    Segment 0 carries the title and summary; later segments continue from
+    `start_id`, given the frames already `covered` and the learner's quiz
+    `answers` so far. With explain_previous=False the segment skips the
+    explanation of the previous quiz (see generate_explanation_stream) and
+    `start_id` should leave room for it. Same yields/raises contract as
+    generate_story_stream.
+    """
+    if not OPENROUTER_API_KEY:
+        raise RuntimeError("OPENROUTER_API_KEY is not configured in the environment.")
 
-                raw = line[len("data:"):].strip()
+    messages = [
+        {"role": "system", "content": _SEGMENT_SYSTEM_PROMPT},
+        {"role": "user", "content": _build_segment_message(
+            character, file_content, prompt, user_name,
+            segment_index, start_id, covered, answers, final, explain_previous,
+        )},
+    ]
+    async for delta in _stream_with_continuation(messages, resume_from):
+        yield delta
 
-                if raw == "[DONE]":
-                    break
 
+async def generate_explanation_stream(
+    character: Character,
+    user_name: str,
+    covered: list[dict],
+    answer: str,
+    frame_id: int,
+    next_id: Optional[int],
+) -> AsyncGenerator[str, None]:
+    """
+    Streams a single explanation frame ({"frames": [...]}) reacting to the
+    learner's `answer` to the quiz that ends `covered`. Used with segments
+    prefetched before the answer was known. Same yields/raises contract as
+    generate_story_stream.
+    """
+    if not OPENROUTER_API_KEY:
+        raise RuntimeError("OPENROUTER_API_KEY is not configured in the environment.")
+
+    messages = [
+        {"role": "system", "content": _EXPLANATION_SYSTEM_PROMPT},
+        {"role": "user", "content": _build_explanation_message(
+            character, user_name, covered, answer, frame_id, next_id,
+        )},
+    ]
+    async for delta in _stream_with_continuation(messages):
+        yield delta
+
+
+async def _stream_with_continuation(messages: list[dict], partial: str = "") -> AsyncGenerator[str, None]:
+    """
+    Streams a completion, resuming it while the output is truncated. With
+    `partial`, the first request already continues that text.
+    """
+    accumulated = partial
+    deadline = time.monotonic() + OPENROUTER_RETRY_DEADLINE  # shared by the request and its continuations
+
+    async with httpx.AsyncClient(timeout=120.0) as client:
+        for _ in range(MAX_CONTINUATIONS + 1):
+            result: dict = {}
+            payload = _build_payload(messages, accumulated, stream=True)
+
+            if not accumulated:
+                async for delta in _stream_completion(client, payload, result, deadline):
+                    accumulated += delta
+                    yield delta
+            else:
+                # Hold back the start of a continuation until we can tell
+                # whether the model repeated the tail of the previous output.
+                held = ""
+                trimmed = False
                 try:
-                    chunk = json.loads(raw)
-                    delta = chunk["choices"][0]["delta"].get("content", "")
-                    if delta:
-                        yield delta
-                except (json.JSONDecodeError, KeyError, IndexError):
-                    # Skip malformed SSE lines silently
-                    continue
+                    async for delta in _stream_completion(client, payload, result, deadline):
+                        if trimmed:
+                            accumulated += delta
+                            yield delta
+                            continue
+                        held += delta
+                        if len(held) >= 2 * _MIN_OVERLAP_CHARS:
+                            held = _trim_overlap(accumulated, held)
+                            trimmed = True
+                            accumulated += held
+                            if held:
+                                yield held
+                except (RuntimeError, httpx.HTTPError) as exc:
+                    print(f"Warning: Story continuation failed: {exc}")
+                    break
+                if not trimmed:
+                    held = _trim_overlap(accumulated, held)
+                    accumulated += held
+                    if held:
+                        yield held
+
+            if not _needs_continuation(accumulated, result.get("finish_reason")):
+                break
+            print(f"Warning: Story output truncated after {len(accumulated)} chars, continuing")
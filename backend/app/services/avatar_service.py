@@ -0,0 +1,238 @@
+"""
+Content-addressed avatar store.
+
+Custom avatars arrive as data URIs on CharacterCreate.avatar. They are
+decoded, stored once under the SHA-256 of their bytes, and the character
+document keeps only `avatar_sha256`. Responses turn the hash back into URLs
+served by avatar_router with immutable caching — the same bytes always have
+the same URL, so browsers never download an avatar twice.
+
+Resized variants (AVATAR_VARIANTS, WebP) are generated with Pillow when it
+is installed: eagerly on upload, or lazily on first request. Without Pillow
+variant URLs redirect to the original.
+
+Blob keys are "<sha256>" for the original and "<sha256>.<variant>".
+Avatars given as plain URLs (e.g. generated avatar services, bundled
+assets) are left untouched.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from io import BytesIO
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+
+from app.config import AVATAR_STORE, AVATAR_DIR, AVATAR_MAX_BYTES, AVATAR_VARIANTS
+from app.services.db_service import save_blob_to_db, get_blob_from_db, replace_inline_avatar_in_db
+
+try:
+    from PIL import Image
+    _PIL_AVAILABLE = True
+except ImportError:
+    _PIL_AVAILABLE = False
+
+
+_DATA_URI = re.compile(r"^data:([\w/+.-]+)?(;[\w=-]+)*;base64,", re.IGNORECASE)
+_SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+# Raster formats only: SVG can carry script and is not accepted.
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def sniff_content_type(data: bytes) -> Optional[str]:
+    """Image type from the leading bytes, or None if it isn't a supported image."""
+    for signature, content_type in _SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def is_data_uri(avatar: Optional[str]) -> bool:
+    return bool(avatar) and _DATA_URI.match(avatar[:200]) is not None
+
+
+def is_avatar_hash(value: str) -> bool:
+    return bool(_SHA256_HEX.match(value))
+
+
+# ─── Blob stores ──────────────────────────────────────────────────────────────
+
+class LocalAvatarStore:
+    """Blobs as files under `root`, fanned out by hash prefix. put() raises OSError on failure."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def _write(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            return  # content-addressed: same key, same bytes
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Unique per write: concurrent uploads of the same bytes must not share it
+        tmp = tempfile.NamedTemporaryFile(dir=directory, prefix=f"{key}.", suffix=".tmp", delete=False)
+        try:
+            with tmp:
+                tmp.write(data)
+            os.replace(tmp.name, path)  # readers never see a partial file
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._write, key, data)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, key)
+
+
+class GridFSAvatarStore:
+    """Blobs in the MongoDB `avatars` GridFS bucket. put() raises on failure."""
+
+    async def put(self, key: str, data: bytes) -> None:
+        await save_blob_to_db(key, data)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await get_blob_from_db(key)
+
+
+_store = GridFSAvatarStore() if AVATAR_STORE == "gridfs" else LocalAvatarStore(AVATAR_DIR)
+
+
+# ─── Variants ─────────────────────────────────────────────────────────────────
+
+def _resize(data: bytes, size: int) -> bytes:
+    with Image.open(BytesIO(data)) as image:
+        image.seek(0)  # first frame of animated GIF/WebP
+        image = image.convert("RGBA")
+        image.thumbnail((size, size))
+        out = BytesIO()
+        image.save(out, format="WEBP", quality=85, method=4)
+        return out.getvalue()
+
+
+async def _make_variant(sha256: str, original: bytes, variant: str) -> Optional[bytes]:
+    if not _PIL_AVAILABLE:
+        return None
+    try:
+        data = await asyncio.to_thread(_resize, original, AVATAR_VARIANTS[variant])
+    except Exception as exc:
+        print(f"Warning: Avatar variant '{variant}' failed for {sha256[:12]}: {exc}")
+        return None
+    try:
+        await _store.put(f"{sha256}.{variant}", data)
+    except Exception as exc:
+        print(f"Warning: Avatar variant '{variant}' not stored for {sha256[:12]}: {exc}")
+    return data
+
+
+# ─── Public API ───────────────────────────────────────────────────────────────
+
+async def store_avatar(data_uri: str) -> str:
+    """
+    Stores a data-URI avatar (and its variants) and returns its SHA-256.
+
+    Raises:
+        HTTPException 400 — malformed data URI or not a PNG/JPEG/GIF/WebP image.
+        HTTPException 413 — larger than AVATAR_MAX_BYTES.
+        HTTPException 503 — the original could not be written to the store.
+    """
+    payload = data_uri.split(",", 1)[1] if "," in data_uri else ""
+    if len(payload) * 3 // 4 > AVATAR_MAX_BYTES + 2:
+        raise HTTPException(status_code=413, detail=f"Avatar exceeds {AVATAR_MAX_BYTES // 1_000_000} MB.")
+    try:
+        data = base64.b64decode(payload, validate=False)
+    except binascii.Error:
+        raise HTTPException(status_code=400, detail="Avatar is not a valid base64 data URI.")
+    if len(data) > AVATAR_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Avatar exceeds {AVATAR_MAX_BYTES // 1_000_000} MB.")
+    if sniff_content_type(data) is None:
+        raise HTTPException(status_code=400, detail="Avatar must be a PNG, JPEG, GIF or WebP image.")
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    try:
+        await _store.put(sha256, data)  # must be durable before the caller drops the data URI
+    except Exception as exc:
+        print(f"Warning: Avatar store failed for {sha256[:12]}: {exc}")
+        raise HTTPException(status_code=503, detail="Avatar storage is temporarily unavailable.")
+    await asyncio.gather(*(_make_variant(sha256, data, v) for v in AVATAR_VARIANTS))
+    return sha256
+
+
+async def read_avatar(sha256: str, variant: Optional[str] = None) -> Optional[tuple[bytes, str]]:
+    """
+    (bytes, content type) of an avatar or one of its variants. Missing
+    variants are generated on demand. None if the avatar (or, without
+    Pillow, the variant) isn't available.
+    """
+    if variant is None:
+        data = await _store.get(sha256)
+        return (data, sniff_content_type(data) or "application/octet-stream") if data is not None else None
+
+    data = await _store.get(f"{sha256}.{variant}")
+    if data is None:
+        original = await _store.get(sha256)
+        if original is None:
+            return None
+        data = await _make_variant(sha256, original, variant)
+        if data is None:
+            return None
+    return data, "image/webp"
+
+
+async def externalise_avatar(character: dict) -> dict:
+    """
+    Moves an inline data-URI avatar into the store, leaving `avatar_sha256`.
+    The data URI is only removed once the blob has been written.
+    """
+    avatar = character.get("avatar")
+    if is_data_uri(avatar):
+        character["avatar_sha256"] = await store_avatar(avatar)
+        del character["avatar"]
+    return character
+
+
+async def present_avatar(character: dict, url_for: Callable[..., str]) -> dict:
+    """
+    Fills `avatar` (original) and `avatarVariants` with URLs for a stored
+    avatar. Characters still holding an inline data URI are migrated first.
+    """
+    inline = character.get("avatar")
+    if is_data_uri(inline):
+        try:
+            await externalise_avatar(character)
+        except Exception:
+            return character  # rejected or not stored: keep it inline, retry next time
+        await replace_inline_avatar_in_db(inline, character["avatar_sha256"])
+
+    sha256 = character.get("avatar_sha256")
+    if sha256:
+        character["avatar"] = str(url_for("get_avatar", sha256=sha256))
+        character["avatarVariants"] = {
+            variant: str(url_for("get_avatar_variant", sha256=sha256, variant=variant))
+            for variant in AVATAR_VARIANTS
+        }
+    return character
@@ -0,0 +1,304 @@
+"""
+WebSocket connection manager shared by every ws_router handler.
+
+  admission   at most WS_MAX_CONNECTIONS sockets per worker and
+              WS_MAX_CONNECTIONS_PER_IP per client address; refused sockets
+              are closed with 1013 (try again later)
+  heartbeat   sockets opened with heartbeat=True (voice) get an app-level
+              {"type": "ping"} every WS_PING_INTERVAL. Clients answer
+              {"type": "pong"}; a client that has answered before and then
+              goes quiet for WS_PONG_TIMEOUT is dropped. Clients that never
+              answer are governed by the idle timeout alone. Story and job
+              protocols have no ping message, so they get none.
+  idle        every socket is closed with 1000 after WS_IDLE_TIMEOUT without
+              activity, so clients can reconnect on demand and half-open
+              ones give their slot back. Activity is a client message on
+              heartbeat sockets, and a client message or a completed server
+              send on the push-only story and job sockets. The handler is
+              told to stop through Connection.handoff.
+  drain       on shutdown new sockets are refused; graceful sockets (story
+              streams) get WS_DRAIN_SECONDS to finish, others are closed with
+              1012 (service restart). Graceful sockets still open at the
+              deadline are told to hand off (see Connection.handoff).
+
+uvicorn closes every WebSocket with 1012 *before* running the lifespan
+shutdown, so install_drain_on_signals() runs the drain first when the
+process receives SIGTERM/SIGINT, then hands the signal back to the server.
+A second signal skips the drain.
+"""
+
+import asyncio
+import signal
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, AsyncIterator, Optional, TypeVar
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.config import (
+    WS_MAX_CONNECTIONS,
+    WS_MAX_CONNECTIONS_PER_IP,
+    WS_PING_INTERVAL,
+    WS_PONG_TIMEOUT,
+    WS_IDLE_TIMEOUT,
+    WS_DRAIN_SECONDS,
+)
+from app.services.json_service import dumps_text
+
+T = TypeVar("T")
+
+CLOSE_NORMAL = 1000
+CLOSE_GOING_AWAY = 1001
+CLOSE_SERVICE_RESTART = 1012
+CLOSE_TRY_AGAIN_LATER = 1013
+
+_PING = dumps_text({"type": "ping"})
+
+
+@dataclass(eq=False)
+class Connection:
+    websocket: WebSocket
+    kind: str
+    ip: str
+    heartbeat: bool = False
+    graceful: bool = False
+    last_activity: float = field(default_factory=time.monotonic)
+    last_sent: float = field(default_factory=time.monotonic)
+    last_pong: Optional[float] = None
+    closed: bool = False  # closed by the server; further sends would fail
+    # Set when the server wants the handler to wrap up (and hand the client off)
+    handoff: asyncio.Event = field(default_factory=asyncio.Event)
+    _send_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    def touch(self) -> None:
+        """Records client activity (resets the idle timer)."""
+        self.last_activity = time.monotonic()
+
+    def pong(self) -> None:
+        self.last_pong = time.monotonic()
+
+    def idle_for(self, now: float) -> float:
+        """Seconds without activity (see the module docstring)."""
+        if self.heartbeat:
+            return now - self.last_activity
+        return now - max(self.last_activity, self.last_sent)
+
+    async def send_text(self, data: str) -> None:
+        async with self._send_lock:
+            if self.closed:
+                raise WebSocketDisconnect(CLOSE_NORMAL)
+            await self.websocket.send_text(data)
+        self.last_sent = time.monotonic()
+
+    async def send_bytes(self, data: bytes) -> None:
+        async with self._send_lock:
+            if self.closed:
+                raise WebSocketDisconnect(CLOSE_NORMAL)
+            await self.websocket.send_bytes(data)
+        self.last_sent = time.monotonic()
+
+    async def close(self, code: int, reason: str = "") -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            async with self._send_lock:
+                await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass  # already closed by the client
+
+
+class ConnectionManager:
+    def __init__(self):
+        self._connections: set[Connection] = set()
+        self._per_ip: Counter = Counter()
+        self._reaper: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()  # set whenever a connection is released
+        self.draining = False
+
+    # ── Admission ──────────────────────────────────────────────────────────────
+
+    def _refusal(self, ip: str) -> Optional[str]:
+        if self.draining:
+            return "Server is restarting, please reconnect."
+        if len(self._connections) >= WS_MAX_CONNECTIONS:
+            return "Too many connections, please retry later."
+        if self._per_ip[ip] >= WS_MAX_CONNECTIONS_PER_IP:
+            return "Too many connections from this address."
+        return None
+
+    @asynccontextmanager
+    async def session(
+        self,
+        websocket: WebSocket,
+        kind: str,
+        subprotocol: Optional[str] = None,
+        heartbeat: bool = False,
+        graceful: bool = False,
+    ) -> AsyncGenerator[Optional[Connection], None]:
+        """
+        Accepts `websocket` and tracks it for the duration of the block.
+        Yields None if the socket was refused (it is already closed).
+        """
+        ip = websocket.client.host if websocket.client else "unknown"
+        await websocket.accept(subprotocol=subprotocol)
+
+        reason = self._refusal(ip)
+        if reason is not None:
+            try:
+                await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason=reason)
+            except Exception:
+                pass
+            yield None
+            return
+
+        conn = Connection(websocket, kind, ip, heartbeat=heartbeat, graceful=graceful)
+        self._connections.add(conn)
+        self._per_ip[ip] += 1
+        self._ensure_reaper()
+        try:
+            yield conn
+        finally:
+            self._connections.discard(conn)
+            self._per_ip[ip] -= 1
+            if self._per_ip[ip] <= 0:
+                del self._per_ip[ip]
+            self._changed.set()
+
+    def snapshot(self) -> dict:
+        return {
+            "open": len(self._connections),
+            "by_kind": dict(Counter(c.kind for c in self._connections)),
+            "draining": self.draining,
+        }
+
+    # ── Heartbeat / idle reaping ──────────────────────────────────────────────
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap())
+
+    async def _reap(self) -> None:
+        while self._connections:
+            await asyncio.sleep(WS_PING_INTERVAL)
+            now = time.monotonic()
+            for conn in list(self._connections):
+                if conn.idle_for(now) > WS_IDLE_TIMEOUT:
+                    conn.handoff.set()
+                    await conn.close(CLOSE_NORMAL, "idle timeout")
+                elif not conn.heartbeat:
+                    continue
+                elif conn.last_pong is not None and now - conn.last_pong > WS_PONG_TIMEOUT:
+                    await conn.close(CLOSE_GOING_AWAY, "heartbeat timeout")
+                else:
+                    try:
+                        await conn.send_text(_PING)
+                    except Exception:
+                        pass  # the handler sees the disconnect and releases it
+
+    # ── Drain ──────────────────────────────────────────────────────────────────
+
+    async def _wait_until(self, predicate, timeout: float) -> bool:
+        """Waits for predicate() to hold after connection changes, up to `timeout`."""
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return predicate()
+        return True
+
+    async def drain(self, timeout: float = WS_DRAIN_SECONDS) -> None:
+        """
+        Refuses new sockets, closes non-graceful ones with 1012, lets graceful
+        ones finish for up to `timeout`, then asks the rest to hand off.
+        """
+        if self.draining:
+            return
+        self.draining = True
+        print(f"Info: Draining {len(self._connections)} WebSocket connection(s)")
+
+        for conn in [c for c in self._connections if not c.graceful]:
+            conn.handoff.set()
+            await conn.close(CLOSE_SERVICE_RESTART, "server restarting")
+
+        if not await self._wait_until(lambda: not self._connections, timeout):
+            for conn in list(self._connections):
+                conn.handoff.set()
+            await self._wait_until(lambda: not self._connections, 2.0)
+
+        if self._reaper is not None:
+            self._reaper.cancel()
+
+
+connections = ConnectionManager()
+
+
+async def until_handoff(conn: Connection, source: AsyncIterator[T]) -> AsyncGenerator[T, None]:
+    """
+    Yields from `source` until it is exhausted or the manager asks `conn` to
+    hand off, whichever comes first. Check conn.handoff afterwards.
+    """
+    iterator = source.__aiter__()
+    handoff = asyncio.create_task(conn.handoff.wait())
+    try:
+        while True:
+            step = asyncio.create_task(iterator.__anext__())
+            await asyncio.wait({step, handoff}, return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                step.cancel()
+                return
+            try:
+                item = step.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        handoff.cancel()
+
+
+# ─── Shutdown hook ────────────────────────────────────────────────────────────
+
+_drain_task: Optional[asyncio.Task] = None
+
+
+def install_drain_on_signals(manager: ConnectionManager = connections) -> None:
+    """
+    Wraps the server's SIGTERM/SIGINT handlers so the first signal drains
+    WebSockets before the server starts its own shutdown. Call from the
+    lifespan startup, after the server has installed its handlers.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    loop = asyncio.get_running_loop()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        async def drain_then_exit(signum: int, previous=previous) -> None:
+            try:
+                await manager.drain()
+            finally:
+                previous(signum, None)
+
+        def start_drain(signum: int, drain_then_exit=drain_then_exit) -> None:
+            global _drain_task
+            _drain_task = loop.create_task(drain_then_exit(signum))
+
+        def handler(signum, frame, previous=previous, start_drain=start_drain):
+            if _drain_task is not None or manager.draining:
+                previous(signum, frame)  # second signal: shut down now
+                return
+            # Signal handlers run between bytecodes; wake the loop to start the drain
+            loop.call_soon_threadsafe(start_drain, signum)
+
+        signal.signal(sig, handler)
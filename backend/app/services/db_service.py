@@ -1,40 +1,247 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+import base64
+import json
+import zlib
+from datetime import datetime, timezone
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import ASCENDING, DESCENDING
+from bson.binary import Binary
+from gridfs.errors import NoFile
+from pymongo.errors import ConnectionFailure, PyMongoError
+from contextlib import asynccontextmanager
 from app.config import MONGO_URI, DB_NAME
-from typing import Optional, Dict, Any
+from app.services.resilience_service import mongo_breaker
+from typing import Optional, Dict, Any, Tuple
+
+try:
+    import zstandard
+    _ZSTD_AVAILABLE = True
+except ImportError:
+    _ZSTD_AVAILABLE = False
 
 client = AsyncIOMotorClient(MONGO_URI, serverSelectionTimeoutMS=2000)
 db = client[DB_NAME]
 stories_collection = db["stories"]
 characters_collection = db["characters"]
+documents_collection = db["documents"]
+avatars_bucket = AsyncIOMotorGridFSBucket(db, bucket_name="avatars")
+
+# Story documents from schema version 2 onwards keep their frames as one
+# compressed JSON blob; title/summary/frame_count stay queryable for listings.
+# Version 1 documents (plain "frames" array) are still read transparently.
+STORY_SCHEMA_VERSION = 2
+
+@asynccontextmanager
+async def _mongo_call():
+    """
+    Runs one MongoDB operation through the mongo circuit breaker. While the
+    breaker is open this raises CircuitOpenError immediately instead of
+    waiting out serverSelectionTimeoutMS; callers treat it like any other
+    database failure. Only connection failures count against the breaker.
+
+    Keep the block to the Mongo I/O itself: building queries and shaping
+    results belong outside it, so that only an answer from Mongo (a result or
+    a driver error) counts as a successful probe.
+    """
+    mongo_breaker.check()
+    try:
+        yield
+    except ConnectionFailure:
+        mongo_breaker.record_failure()
+        raise
+    except PyMongoError:
+        mongo_breaker.record_success()  # Mongo answered; the error is ours
+        raise
+    except BaseException:
+        mongo_breaker.release_probe()  # not a driver error, or cancelled mid-call
+        raise
+    else:
+        mongo_breaker.record_success()
+
+async def ensure_indexes() -> None:
+    """Create the indexes backing the story library listing (idempotent)."""
+    try:
+        async with _mongo_call():
+            await stories_collection.create_index(
+                [("owner_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                name="owner_created_at",
+            )
+            await stories_collection.create_index(
+                [("created_at", DESCENDING), ("_id", DESCENDING)],
+                name="created_at",
+            )
+    except Exception as e:
+        print(f"Warning: Index creation failed: {e}")
+
+async def backfill_story_summaries() -> None:
+    """
+    Gives stories saved before the library listing existed the fields it
+    sorts and reports on: created_at from the ObjectId timestamp, and
+    frame_count from the plain v1 "frames" array. Runs server-side
+    (idempotent), so frames are never transferred.
+    """
+    try:
+        async with _mongo_call():
+            dated = await stories_collection.update_many(
+                {"created_at": {"$exists": False}},
+                [{"$set": {"created_at": {"$toDate": "$_id"}}}],
+            )
+            counted = await stories_collection.update_many(
+                {"frame_count": {"$exists": False}},
+                [{"$set": {"frame_count": {
+                    "$cond": [{"$isArray": "$frames"}, {"$size": "$frames"}, 0]
+                }}}],
+            )
+    except Exception as e:
+        print(f"Warning: Story backfill failed: {e}")
+        return
+    if dated.modified_count or counted.modified_count:
+        print(
+            f"Info: Backfilled created_at on {dated.modified_count} and "
+            f"frame_count on {counted.modified_count} older stories"
+        )
+
+# ─── Frame compression ────────────────────────────────────────────────────────
+
+def _compress_frames(frames: list) -> Tuple[str, bytes]:
+    raw = json.dumps(frames, separators=(",", ":")).encode("utf-8")
+    if _ZSTD_AVAILABLE:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(raw)
+    return "zlib", zlib.compress(raw, 9)
+
+def _decompress_frames(codec: str, blob: bytes) -> list:
+    if codec == "zstd":
+        if not _ZSTD_AVAILABLE:
+            raise RuntimeError("Story frames are zstd-compressed but zstandard is not installed.")
+        raw = zstandard.ZstdDecompressor().decompress(blob)
+    elif codec == "zlib":
+        raw = zlib.decompress(blob)
+    else:
+        raise ValueError(f"Unknown frames codec '{codec}'")
+    return json.loads(raw)
 
-async def save_story_to_db(story_dict: Dict[str, Any]) -> Optional[str]:
+def _encode_story(story_dict: Dict[str, Any], owner_id: str) -> Dict[str, Any]:
+    doc = {k: v for k, v in story_dict.items() if k not in ("id", "frames")}
+    frames = story_dict.get("frames") or []
+    codec, blob = _compress_frames(frames)
+    doc.update(
+        frame_count=len(frames),
+        frames_codec=codec,
+        frames_blob=Binary(blob),
+        schema_version=STORY_SCHEMA_VERSION,
+        created_at=datetime.now(timezone.utc),
+    )
+    if owner_id:
+        doc["owner_id"] = owner_id
+    return doc
+
+def _decode_story(doc: Dict[str, Any]) -> Dict[str, Any]:
+    if "frames_blob" in doc:
+        doc["frames"] = _decompress_frames(doc.pop("frames_codec"), bytes(doc.pop("frames_blob")))
+    doc["schema_version"] = doc.get("schema_version", 1)  # v1 documents predate the field
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+# ─── Cursor helpers (opaque to clients) ───────────────────────────────────────
+
+def _encode_cursor(created_at: datetime, obj_id) -> str:
+    raw = json.dumps([created_at.isoformat(), str(obj_id)]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str):
+    from bson.objectid import ObjectId
+    padded = cursor + "=" * (-len(cursor) % 4)
+    created_at, obj_id = json.loads(base64.urlsafe_b64decode(padded))
+    return datetime.fromisoformat(created_at), ObjectId(obj_id)
+
+# ─── Stories ──────────────────────────────────────────────────────────────────
+
+async def save_story_to_db(story_dict: Dict[str, Any], owner_id: str = "") -> Optional[str]:
     """Save a story document to MongoDB. Returns None if DB is unavailable."""
+    doc = _encode_story(story_dict, owner_id)
     try:
-        result = await stories_collection.insert_one(story_dict)
+        async with _mongo_call():
+            result = await stories_collection.insert_one(doc)
         return str(result.inserted_id)
     except Exception as e:
         print(f"Warning: Database save failed: {e}")
         return None
 
 async def get_story_from_db(story_id: str) -> Optional[Dict[str, Any]]:
-    """Retrieve a story by its MongoDB ObjectId string."""
+    """Retrieve a story by its MongoDB ObjectId string, decompressing its frames."""
     from bson.objectid import ObjectId
+    if not ObjectId.is_valid(story_id):
+        return None
     try:
-        obj_id = ObjectId(story_id)
-        story = await stories_collection.find_one({"_id": obj_id})
-        if story:
-            story["id"] = str(story["_id"])
-            del story["_id"]
-        return story
+        async with _mongo_call():
+            story = await stories_collection.find_one({"_id": ObjectId(story_id)})
+        return _decode_story(story) if story else None
     except Exception as e:
         print(f"Warning: Database fetch failed: {e}")
         return None
 
+async def list_stories_from_db(
+    owner_id: str = "",
+    cursor: Optional[str] = None,
+    limit: int = 20,
+) -> Tuple[list[Dict[str, Any]], Optional[str]]:
+    """
+    One page of story summaries, newest first.
+
+    Only the summary fields are projected, so frames are never read. Returns
+    (items, next_cursor); next_cursor is None on the last page.
+
+    Raises ValueError for a malformed cursor.
+    """
+    # Older stories get created_at from backfill_story_summaries() at startup
+    query: Dict[str, Any] = {"created_at": {"$exists": True}}
+    if owner_id:
+        query["owner_id"] = owner_id
+    if cursor:
+        try:
+            created_at, obj_id = _decode_cursor(cursor)
+        except Exception:
+            raise ValueError("Invalid cursor")
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": obj_id}},
+        ]
+
+    projection = {"title": 1, "summary": 1, "frame_count": 1, "created_at": 1}
+    try:
+        async with _mongo_call():
+            docs = await (
+                stories_collection.find(query, projection)
+                .sort([("created_at", DESCENDING), ("_id", DESCENDING)])
+                .limit(limit + 1)
+                .to_list(length=limit + 1)
+            )
+    except Exception as e:
+        print(f"Warning: Story listing failed: {e}")
+        return [], None
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = _encode_cursor(docs[-1]["created_at"], docs[-1]["_id"])
+
+    items = [
+        {
+            "id": str(doc["_id"]),
+            "title": doc.get("title", ""),
+            "summary": doc.get("summary", ""),
+            "frame_count": doc.get("frame_count", 0),
+            "created_at": doc.get("created_at"),
+        }
+        for doc in docs
+    ]
+    return items, next_cursor
+
 async def save_character_to_db(character_dict: Dict[str, Any]) -> Optional[str]:
     """Save a character to MongoDB."""
     try:
-        result = await characters_collection.insert_one(character_dict)
-        return str(result.inserted_id)
+        async with _mongo_call():
+            result = await characters_collection.insert_one(character_dict)
+            return str(result.inserted_id)
     except Exception as e:
         print(f"Warning: Character save failed: {e}")
         return None
@@ -42,40 +249,101 @@ async def save_character_to_db(character_dict: Dict[str, Any]) -> Optional[str]:
 async def get_character_from_db(character_id: str) -> Optional[Dict[str, Any]]:
     """Retrieve a character by ID."""
     from bson.objectid import ObjectId
+    query = {"id": character_id} if not ObjectId.is_valid(character_id) else {"_id": ObjectId(character_id)}
     try:
-        query = {"id": character_id} if not ObjectId.is_valid(character_id) else {"_id": ObjectId(character_id)}
-        character = await characters_collection.find_one(query)
-        if character:
-            if "_id" in character:
-                character["id"] = str(character["_id"])
-                del character["_id"]
-        return character
+        async with _mongo_call():
+            character = await characters_collection.find_one(query)
     except Exception as e:
         print(f"Warning: Character fetch failed: {e}")
         return None
+    if character:
+        if "_id" in character:
+            character["id"] = str(character["_id"])
+            del character["_id"]
+    return character
 
 async def get_characters_by_ids(character_ids: list[str]) -> list[Dict[str, Any]]:
     """Retrieve multiple characters by a list of IDs."""
     from bson.objectid import ObjectId
+    query_conditions = []
+    for cid in character_ids:
+        if ObjectId.is_valid(cid):
+            query_conditions.append({"_id": ObjectId(cid)})
+        query_conditions.append({"id": cid}) # also try matching string id directly since some defaults or user IDs may be strings
+
+    if not query_conditions:
+        return []
+
     try:
-        query_conditions = []
-        for cid in character_ids:
-            if ObjectId.is_valid(cid):
-                query_conditions.append({"_id": ObjectId(cid)})
-            query_conditions.append({"id": cid}) # also try matching string id directly since some defaults or user IDs may be strings
-
-        if not query_conditions:
-            return []
-
-        cursor = characters_collection.find({"$or": query_conditions})
-        characters = await cursor.to_list(length=100)
-        
-        for char in characters:
-            if "_id" in char:
-                # favor original id if set, else use Mongo _id
-                char["id"] = char.get("id", str(char["_id"])) 
-                del char["_id"]
-        return characters
+        async with _mongo_call():
+            cursor = characters_collection.find({"$or": query_conditions})
+            characters = await cursor.to_list(length=100)
     except Exception as e:
         print(f"Warning: Batch characters fetch failed: {e}")
         return []
+
+    for char in characters:
+        if "_id" in char:
+            # favor original id if set, else use Mongo _id
+            char["id"] = char.get("id", str(char["_id"])) 
+            del char["_id"]
+    return characters
+
+async def replace_inline_avatar_in_db(avatar: str, avatar_sha256: str) -> None:
+    """Swap an inline (data-URI) avatar for a blob-store reference on every character using it."""
+    try:
+        async with _mongo_call():
+            await characters_collection.update_many(
+                {"avatar": avatar},
+                {"$set": {"avatar_sha256": avatar_sha256}, "$unset": {"avatar": ""}},
+            )
+    except Exception as e:
+        print(f"Warning: Character avatar update failed: {e}")
+
+# ─── Extracted documents (upload-by-hash) ─────────────────────────────────────
+
+async def save_document_to_db(sha256: str, size: int, text: str, version: int) -> None:
+    """Upsert the extracted text for a file hash, tagged with the extractor version."""
+    try:
+        async with _mongo_call():
+            await documents_collection.update_one(
+                {"_id": sha256},
+                {"$set": {"size": size, "text": text, "version": version, "updated_at": datetime.now(timezone.utc)}},
+                upsert=True,
+            )
+    except Exception as e:
+        print(f"Warning: Document save failed: {e}")
+
+async def get_document_from_db(sha256: str) -> Optional[Dict[str, Any]]:
+    """Retrieve {size, text, version} for a file hash, or None. Documents saved
+    before versioning have no "version"."""
+    try:
+        async with _mongo_call():
+            return await documents_collection.find_one({"_id": sha256}, {"size": 1, "text": 1, "version": 1})
+    except Exception as e:
+        print(f"Warning: Document fetch failed: {e}")
+        return None
+
+# ─── Avatar blobs (GridFS) ────────────────────────────────────────────────────
+
+async def save_blob_to_db(key: str, data: bytes) -> None:
+    """
+    Store a content-addressed blob under `key` unless it already exists.
+    Unlike the other writers this raises on failure: callers drop their own
+    copy of the data once it returns.
+    """
+    async with _mongo_call():
+        if await db["avatars.files"].find_one({"_id": key}, {"_id": 1}) is None:
+            await avatars_bucket.upload_from_stream_with_id(key, key, data)
+
+async def get_blob_from_db(key: str) -> Optional[bytes]:
+    """Retrieve a blob by key, or None."""
+    try:
+        async with _mongo_call():
+            stream = await avatars_bucket.open_download_stream(key)
+            return await stream.read()
+    except NoFile:
+        return None
+    except Exception as e:
+        print(f"Warning: Blob fetch failed: {e}")
+        return None
@@ -0,0 +1,112 @@
+"""
+Upload-by-hash document store.
+
+Remembers the extracted text of every uploaded file under the SHA-256 of its
+raw bytes. A client that already knows a file's hash and size can start a
+story without uploading it again; many students share the same course PDFs,
+so this saves both upload bandwidth and extraction time.
+
+An in-process LRU of DOCUMENT_CACHE_MAX_ENTRIES sits in front of the MongoDB
+`documents` collection, which survives restarts and is shared by workers.
+Entries record the EXTRACTOR_VERSION that produced them; text from an older
+extractor is treated as unknown, so the file is extracted again.
+"""
+
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import UploadFile, HTTPException
+
+from app.config import DOCUMENT_CACHE_MAX_ENTRIES
+from app.services.db_service import save_document_to_db, get_document_from_db
+from app.services.file_service import EXTRACTOR_VERSION, extract_text_from_bytes
+
+_SHA256_HEX = re.compile(r"^[0-9a-f]{64}$")
+
+_cache: "OrderedDict[str, tuple[int, str]]" = OrderedDict()  # sha256 → (size, text)
+
+
+def _cache_put(sha256: str, size: int, text: str) -> None:
+    _cache[sha256] = (size, text)
+    _cache.move_to_end(sha256)
+    while len(_cache) > DOCUMENT_CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+
+
+async def lookup_document(sha256: str, size: Optional[int] = None) -> Optional[str]:
+    """
+    Extracted text for a known hash, or None. When `size` is given it must
+    match the stored size as well.
+    """
+    sha256 = sha256.lower()
+    entry = _cache.get(sha256)
+    if entry is None:
+        doc = await get_document_from_db(sha256)
+        if doc is None or doc.get("version") != EXTRACTOR_VERSION:
+            return None  # unknown, or extracted by an older version
+        entry = (doc["size"], doc["text"])
+        _cache_put(sha256, *entry)
+    else:
+        _cache.move_to_end(sha256)
+
+    stored_size, text = entry
+    if size is not None and size != stored_size:
+        return None
+    return text
+
+
+async def remember_document(sha256: str, size: int, text: str) -> None:
+    _cache_put(sha256, size, text)
+    await save_document_to_db(sha256, size, text, EXTRACTOR_VERSION)
+
+
+async def resolve_material(
+    file: Optional[UploadFile],
+    file_sha256: str = "",
+    file_size: Optional[int] = None,
+) -> str:
+    """
+    Returns the extracted text for a request that carries either the file
+    itself or just its SHA-256 (and optionally its size).
+
+    Raises:
+        HTTPException 404 — hash-only request for a document we don't hold;
+                            the client should retry with the file attached.
+        HTTPException 400/422/500 — bad input or extraction failure.
+    """
+    if file is None:
+        if not file_sha256:
+            raise HTTPException(status_code=422, detail="Send either 'file' or 'file_sha256'.")
+        if not _SHA256_HEX.match(file_sha256.lower()):
+            raise HTTPException(status_code=422, detail="'file_sha256' must be a 64-character hex digest.")
+        text = await lookup_document(file_sha256, file_size)
+        if text is None:
+            raise HTTPException(
+                status_code=404,
+                detail="upload_required: no document with this hash is known. Retry with the file attached.",
+            )
+        return text
+
+    raw_bytes = await file.read()
+    digest = hashlib.sha256(raw_bytes).hexdigest()
+
+    text = await lookup_document(digest, len(raw_bytes))
+    if text is not None:
+        return text  # same bytes seen before — skip extraction
+
+    try:
+        text = extract_text_from_bytes(
+            raw_bytes,
+            filename=file.filename or "",
+            content_type=file.content_type or "",
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except RuntimeError as exc:
+        raise HTTPException(status_code=500, detail=str(exc))
+
+    if text.strip():
+        await remember_document(digest, len(raw_bytes), text)
+    return text
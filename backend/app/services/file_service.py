@@ -1,4 +1,7 @@
 import io
+import re
+from collections import Counter
+from dataclasses import dataclass
 from fastapi import UploadFile, HTTPException
 
 try:
@@ -10,6 +13,126 @@ except ImportError:
 from app.config import MAX_CONTENT_CHARS
 
 
+# ─── Normalisation (runs before the MAX_CONTENT_CHARS cut) ────────────────────
+
+# Bump whenever extraction or normalisation output changes: cached documents
+# extracted by an older version are re-extracted (see document_service).
+EXTRACTOR_VERSION = 2
+
+# Lines that are only a page number: "12", "- 12 -", "Page 3", "3 / 10", "Page 3 of 10"
+_PAGE_NUMBER_LINE = re.compile(r"^[\s\-–—]*(page\s*)?\d+(\s*(/|of)\s*\d+)?[\s\-–—]*$", re.IGNORECASE)
+_HYPHEN_BREAK = re.compile(r"(\w)-\n[ \t]*([a-z])")
+_SPACE_RUN = re.compile(r"[ \t\u00a0]+")
+_BLANK_RUN = re.compile(r"\n{3,}")
+_WORD = re.compile(r"\w+")
+
+_EDGE_LINES = 3            # lines at the top/bottom of a page checked for headers/footers
+_REPEAT_MIN_PAGES = 3      # a header must repeat on at least this many pages...
+_REPEAT_PAGE_SHARE = 0.5   # ...and on at least this share of them
+_SHINGLE_SIZE = 5
+_NEAR_DUPLICATE_SHARE = 0.9  # paragraphs whose shingles are this covered are dropped
+
+
+@dataclass
+class NormalisationReport:
+    original_chars: int
+    normalised_chars: int
+    repeated_lines_removed: int = 0
+    duplicate_paragraphs_removed: int = 0
+
+    @property
+    def chars_saved(self) -> int:
+        return self.original_chars - self.normalised_chars
+
+
+def _line_key(line: str) -> str:
+    # "Chapter 2 — Page 14" and "Chapter 2 — Page 15" are the same running header
+    return re.sub(r"\d+", "#", line.strip().lower())
+
+
+def _strip_repeated_lines(pages: list[str], report: NormalisationReport) -> list[str]:
+    """Removes page numbers and headers/footers repeated across pages (page edges only)."""
+    split_pages = [page.splitlines() for page in pages]
+
+    repeated: set[str] = set()
+    if len(split_pages) >= _REPEAT_MIN_PAGES:
+        counts: Counter = Counter()
+        for lines in split_pages:
+            edges = [l for l in lines if l.strip()]
+            edges = edges[:_EDGE_LINES] + edges[-_EDGE_LINES:]
+            counts.update({_line_key(l) for l in edges})
+        threshold = max(_REPEAT_MIN_PAGES, _REPEAT_PAGE_SHARE * len(split_pages))
+        # Keys without letters are numbers ("#", "# / #"): different values on
+        # each page look alike once digits are masked, so they are left to the
+        # page-number rule
+        repeated = {key for key, n in counts.items() if n >= threshold and any(c.isalpha() for c in key)}
+
+    cleaned = []
+    for lines in split_pages:
+        # Only the page edges are touched: a number or repeated line in the
+        # body (a table cell, a year, an answer) is content
+        content = [i for i, l in enumerate(lines) if l.strip()]
+        edges = set(content[:_EDGE_LINES] + content[-_EDGE_LINES:])
+        outermost = set(content[:1] + content[-1:])  # where page numbers sit
+        kept = []
+        for i, line in enumerate(lines):
+            if (i in outermost and _PAGE_NUMBER_LINE.match(line)) or (i in edges and _line_key(line) in repeated):
+                report.repeated_lines_removed += 1
+                continue
+            kept.append(line)
+        cleaned.append("\n".join(kept))
+    return cleaned
+
+
+def _strip_duplicate_paragraphs(text: str, report: NormalisationReport) -> str:
+    """
+    Drops paragraphs already seen verbatim, or whose word shingles are
+    almost all contained in earlier paragraphs (repeated boilerplate).
+    Short paragraphs ("Example:", "Solution:") are always kept.
+    Linear in the text size: a paragraph is only checked against the set of
+    shingles seen so far, never against every earlier paragraph.
+    """
+    seen_shingles: set[tuple] = set()
+    seen_exact: set[str] = set()
+    kept = []
+    for paragraph in text.split("\n\n"):
+        words = _WORD.findall(paragraph.lower())
+        if not words:
+            continue
+        exact = " ".join(words)
+        shingles = {tuple(words[i:i + _SHINGLE_SIZE]) for i in range(max(1, len(words) - _SHINGLE_SIZE + 1))}
+        is_duplicate = len(words) >= 2 * _SHINGLE_SIZE and (
+            exact in seen_exact
+            or len(shingles & seen_shingles) >= _NEAR_DUPLICATE_SHARE * len(shingles)
+        )
+        if is_duplicate:
+            report.duplicate_paragraphs_removed += 1
+            continue
+        seen_exact.add(exact)
+        seen_shingles |= shingles
+        kept.append(paragraph)
+    return "\n\n".join(kept)
+
+
+def normalise_pages(pages: list[str]) -> tuple[str, NormalisationReport]:
+    """
+    Cleans extracted page text so the prompt budget goes to real content:
+    repeated headers/footers and page numbers, hyphenated line breaks,
+    whitespace runs and duplicated paragraphs are removed.
+    """
+    report = NormalisationReport(original_chars=sum(len(p) for p in pages) + max(0, len(pages) - 1), normalised_chars=0)
+
+    text = "\n\n".join(_strip_repeated_lines(pages, report))
+    text = _HYPHEN_BREAK.sub(r"\1\2", text)
+    text = _SPACE_RUN.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    text = _BLANK_RUN.sub("\n\n", text)
+    text = _strip_duplicate_paragraphs(text, report).strip()
+
+    report.normalised_chars = len(text)
+    return text, report
+
+
 # ─── Core extraction (sync, works on raw bytes) ───────────────────────────────
 
 def extract_text_from_bytes(
@@ -25,6 +148,9 @@ def extract_text_from_bytes(
       1. filename extension (.pdf / .txt)
       2. MIME content_type  (application/pdf / text/plain)
 
+    The text is normalised (see normalise_pages) before being cut to
+    MAX_CONTENT_CHARS, and the characters saved are logged per document.
+
     Raises ValueError for unsupported types or empty content.
     """
     filename = filename.lower()
@@ -46,17 +172,26 @@ def extract_text_from_bytes(
 
     # Extract text ------------------------------------------------------------
     if kind == "txt":
-        text = raw_bytes.decode("utf-8", errors="replace")
+        # Form feeds mark page breaks in text exports
+        pages = raw_bytes.decode("utf-8", errors="replace").split("\f")
     else:  # pdf
         if not _PYPDF_AVAILABLE:
             raise RuntimeError("pypdf is not installed. Run: pip install pypdf")
         try:
             reader = pypdf.PdfReader(io.BytesIO(raw_bytes))
             pages = [page.extract_text() or "" for page in reader.pages]
-            text = "\n".join(pages)
         except Exception as exc:
             raise ValueError(f"Could not parse PDF: {exc}")
 
+    text, report = normalise_pages(pages)
+    if report.chars_saved > 0:
+        print(
+            f"Info: Normalised '{filename}': saved {report.chars_saved} chars "
+            f"({report.original_chars} → {report.normalised_chars}; "
+            f"{report.repeated_lines_removed} header/footer lines, "
+            f"{report.duplicate_paragraphs_removed} duplicate paragraphs)"
+        )
+
     return text[:MAX_CONTENT_CHARS]
 
 
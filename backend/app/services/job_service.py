@@ -0,0 +1,209 @@
+"""
+Asynchronous batch story-generation jobs.
+
+A job is a list of (character, extracted text) inputs submitted in one
+request. Each input becomes a background generation gated by a shared
+semaphore, so at most JOB_MAX_CONCURRENCY OpenRouter calls run at once no
+matter how many jobs are queued. Identical inputs — within a job or across
+jobs — are generated once: later items await the in-flight generation or
+reuse the stored story id.
+
+Clients poll get_job() or follow watch_job() for progress; no request worker
+is held while stories are generated. Finished jobs are kept for
+JOB_RETAIN_SECONDS.
+
+For production (multiple workers) replace this with a real task queue.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Optional
+
+from fastapi import HTTPException
+
+from app.config import JOB_MAX_CONCURRENCY, JOB_RETAIN_SECONDS
+from app.models.job import JobItemStatus, JobStatus
+from app.models.story import Character
+from app.services.ai_service import generate_story
+from app.services.db_service import save_story_to_db
+
+
+@dataclass
+class JobInput:
+    filename: str
+    character: Character
+    file_content: str
+    prompt: str
+    user_name: str = ""
+    owner_id: str = ""
+
+    def fingerprint(self) -> str:
+        key = json.dumps(
+            [self.character.model_dump(), self.file_content, self.prompt, self.user_name, self.owner_id],
+            sort_keys=True,
+        )
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class Job:
+    job_id: str
+    items: list[JobItemStatus]
+    created_at: float = field(default_factory=time.monotonic)
+    version: int = 0
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+
+    @property
+    def finished(self) -> bool:
+        return all(item.status in ("done", "failed") for item in self.items)
+
+    def snapshot(self) -> JobStatus:
+        completed = sum(item.status == "done" for item in self.items)
+        failed = sum(item.status == "failed" for item in self.items)
+        if self.finished:
+            status = "done"
+        elif any(item.status != "queued" for item in self.items):
+            status = "running"
+        else:
+            status = "queued"
+        return JobStatus(
+            job_id=self.job_id,
+            status=status,
+            total=len(self.items),
+            completed=completed,
+            failed=failed,
+            items=[item.model_copy() for item in self.items],
+        )
+
+    async def update(self, index: int, **changes) -> None:
+        async with self.changed:
+            item = self.items[index]
+            for key, value in changes.items():
+                setattr(item, key, value)
+            self.version += 1
+            self.changed.notify_all()
+
+
+# ─── Store ────────────────────────────────────────────────────────────────────
+
+_jobs: dict[str, Job] = {}
+_inflight: dict[str, "_Generation"] = {}   # fingerprint → generation in progress
+_completed: dict[str, tuple[str, str]] = {}  # fingerprint → (story_id, title)
+_COMPLETED_CACHE_SIZE = 1000
+_background: set[asyncio.Task] = set()
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _worker_slots() -> asyncio.Semaphore:
+    # Created lazily so it binds to the running event loop
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(JOB_MAX_CONCURRENCY)
+    return _semaphore
+
+
+@dataclass
+class _Generation:
+    task: asyncio.Task
+    started: asyncio.Event  # set once the generation holds a worker slot
+
+
+async def _generate_and_save(job_input: JobInput, started: asyncio.Event) -> tuple[str, str]:
+    async with _worker_slots():
+        started.set()
+        story = await generate_story(
+            character=job_input.character,
+            file_content=job_input.file_content,
+            prompt=job_input.prompt,
+            user_name=job_input.user_name,
+        )
+    story_id = await save_story_to_db(story.model_dump(exclude_none=True), job_input.owner_id)
+    if not story_id:
+        raise RuntimeError("Story was generated but could not be saved to the database.")
+    return story_id, story.title
+
+
+async def _run_item(job: Job, index: int, job_input: JobInput) -> None:
+    fingerprint = job_input.fingerprint()
+
+    if fingerprint in _completed:
+        story_id, title = _completed[fingerprint]
+        await job.update(index, status="done", story_id=story_id, title=title, deduplicated=True)
+        return
+
+    generation = _inflight.get(fingerprint)
+    deduplicated = generation is not None
+    if generation is None:
+        started = asyncio.Event()
+        generation = _Generation(asyncio.create_task(_generate_and_save(job_input, started)), started)
+        _inflight[fingerprint] = generation
+        generation.task.add_done_callback(lambda _: _inflight.pop(fingerprint, None))
+    task = generation.task
+
+    if deduplicated:
+        await job.update(index, deduplicated=True)
+    # Stays "queued" while waiting for one of the JOB_MAX_CONCURRENCY worker slots
+    slot = asyncio.create_task(generation.started.wait())
+    try:
+        await asyncio.wait({task, slot}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        slot.cancel()
+    if generation.started.is_set():
+        await job.update(index, status="running")
+
+    try:
+        story_id, title = await asyncio.shield(task)
+    except HTTPException as exc:
+        await job.update(index, status="failed", error=str(exc.detail))
+        return
+    except Exception as exc:
+        await job.update(index, status="failed", error=str(exc))
+        return
+
+    _completed[fingerprint] = (story_id, title)
+    if len(_completed) > _COMPLETED_CACHE_SIZE:
+        _completed.pop(next(iter(_completed)))  # oldest first
+    await job.update(index, status="done", story_id=story_id, title=title)
+
+
+async def _run_job(job: Job, inputs: list[JobInput]) -> None:
+    await asyncio.gather(*(_run_item(job, i, job_input) for i, job_input in enumerate(inputs)))
+    asyncio.get_running_loop().call_later(JOB_RETAIN_SECONDS, _jobs.pop, job.job_id, None)
+
+
+def submit_job(inputs: list[JobInput]) -> Job:
+    """Registers a job and starts its generations in the background."""
+    job = Job(
+        job_id=str(uuid.uuid4()),
+        items=[
+            JobItemStatus(index=i, filename=job_input.filename, character=job_input.character.name)
+            for i, job_input in enumerate(inputs)
+        ],
+    )
+    _jobs[job.job_id] = job
+
+    task = asyncio.create_task(_run_job(job, inputs))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return job
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    return _jobs.get(job_id)
+
+
+async def watch_job(job: Job) -> AsyncGenerator[JobStatus, None]:
+    """Yields a snapshot now and after every change, until the job finishes."""
+    seen = -1
+    while True:
+        async with job.changed:
+            await job.changed.wait_for(lambda: job.version != seen)
+            seen = job.version
+            snapshot = job.snapshot()
+        yield snapshot
+        if snapshot.status == "done":
+            return
@@ -0,0 +1,85 @@
+"""
+JSON serialisation for hot paths.
+
+Uses orjson when it is installed and falls back to the standard library with
+compact separators otherwise, so every caller gets the same output either way.
+
+Data we produced ourselves (stories read back from MongoDB, models built by
+our own code) is serialised directly instead of being re-validated through
+Pydantic — validation happens once, where untrusted model output enters.
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Union
+
+from fastapi import Response
+
+try:
+    import orjson
+    _ORJSON_AVAILABLE = True
+except ImportError:
+    _ORJSON_AVAILABLE = False
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialise to UTF-8 JSON bytes."""
+    if _ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default).encode("utf-8")
+
+
+def dumps_text(obj: Any) -> str:
+    """Serialise to a JSON string (for WebSocket text frames)."""
+    if _ORJSON_AVAILABLE:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse JSON. Raises ValueError (json.JSONDecodeError or orjson.JSONDecodeError)."""
+    if _ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(Response):
+    """
+    JSONResponse replacement that serialises with dumps() and accepts
+    pre-serialised JSON (str or bytes, e.g. model_dump_json()) as-is.
+    Returning it from a route also skips the route's response_model
+    validation.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        if isinstance(content, str):
+            return content.encode("utf-8")
+        return dumps(content)
+
+
+def story_payload(story_dict: dict[str, Any]) -> dict[str, Any]:
+    """
+    Shapes a trusted story dict like a StoryResponse dump without running
+    validation: storage-only keys are dropped and the optional frame keys are
+    filled in with None. Only for stories validated before they were stored
+    (schema_version >= 2 in get_story_from_db).
+    """
+    frames = story_dict.get("frames") or []
+    for frame in frames:
+        frame.setdefault("options", None)
+        frame.setdefault("nextFrameId", None)
+    return {
+        "id": story_dict.get("id"),
+        "title": story_dict.get("title", ""),
+        "summary": story_dict.get("summary", ""),
+        "frames": frames,
+    }
@@ -0,0 +1,208 @@
+"""
+Circuit breakers and rate-limit-aware retries for external dependencies.
+
+Each dependency (OpenRouter, Sarvam, MongoDB) has one CircuitBreaker:
+
+  closed     requests flow; consecutive failures are counted
+  open       requests fail fast with CircuitOpenError for BREAKER_RESET_SECONDS
+  half-open  one probe request is let through; success closes, failure re-opens.
+             A probe that is cancelled releases its slot; one that never
+             resolves re-opens the breaker after BREAKER_PROBE_TIMEOUT.
+
+send_with_retry() wraps an httpx request: 429/503 responses are retried after
+the server's Retry-After (or a jittered exponential backoff) as long as the
+wait still fits inside the caller's deadline. Connection errors and 5xx count
+against the breaker; a 429 does not, since the dependency is up, just busy.
+"""
+
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+
+from app.config import (
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_SECONDS,
+    BREAKER_PROBE_TIMEOUT,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY,
+    RETRY_MAX_DELAY,
+)
+
+RETRYABLE_STATUS = (429, 503)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        self.name = name
+        self.retry_in = retry_in
+        super().__init__(f"{name} is temporarily unavailable (circuit open, retry in {retry_in:.0f}s)")
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = BREAKER_RESET_SECONDS,
+        probe_timeout: float = BREAKER_PROBE_TIMEOUT,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.probe_timeout = probe_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started_at = 0.0
+
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """True if a request may be sent now."""
+        if self.state == "open":
+            if self.retry_in() > 0:
+                return False
+            self.state = "half_open"
+            self._probe_in_flight = False
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                if time.monotonic() - self._probe_started_at > self.probe_timeout:
+                    self.record_failure()  # stuck probe: back to open
+                return False
+            self._probe_in_flight = True
+            self._probe_started_at = time.monotonic()
+        return True
+
+    def check(self) -> None:
+        """Like allow(), but raises CircuitOpenError instead of returning False."""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in() or self.reset_seconds)
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """Frees the half-open probe slot without an outcome (e.g. the call was cancelled)."""
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"Warning: {self.name} circuit opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retry_in": round(self.retry_in(), 1) if self.state == "open" else 0.0,
+        }
+
+
+# ─── Registry ─────────────────────────────────────────────────────────────────
+
+openrouter_breaker = CircuitBreaker("openrouter")
+sarvam_breaker = CircuitBreaker("sarvam")
+mongo_breaker = CircuitBreaker("mongo", failure_threshold=2, reset_seconds=10.0)
+
+_breakers = {b.name: b for b in (openrouter_breaker, sarvam_breaker, mongo_breaker)}
+
+
+def breaker_states() -> dict[str, dict]:
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
+
+
+# ─── Retry ────────────────────────────────────────────────────────────────────
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Parses a Retry-After header given either in seconds or as an HTTP date."""
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff, never shorter than Retry-After."""
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+    if retry_after is not None:
+        delay = retry_after + random.uniform(0, RETRY_BASE_DELAY)
+    return delay
+
+
+async def send_with_retry(
+    client: httpx.AsyncClient,
+    breaker: CircuitBreaker,
+    method: str,
+    url: str,
+    *,
+    deadline: float,
+    stream: bool = False,
+    **kwargs,
+) -> httpx.Response:
+    """
+    Sends a request through `breaker`, retrying 429/503 and connection errors
+    while the next attempt can still start before `deadline` (a
+    time.monotonic() value).
+
+    Returns the final response — possibly still a 429/503 once retries are
+    exhausted — which the caller must close when `stream` is True.
+
+    Raises:
+        CircuitOpenError — the breaker is open.
+        httpx.RequestError — the last attempt could not connect.
+    """
+    attempt = 0
+    while True:
+        breaker.check()
+        try:
+            response = await client.send(client.build_request(method, url, **kwargs), stream=stream)
+        except httpx.RequestError:
+            breaker.record_failure()
+            delay = backoff_delay(attempt)
+            attempt += 1
+            if attempt >= RETRY_MAX_ATTEMPTS or time.monotonic() + delay >= deadline:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            breaker.release_probe()  # cancelled: neither success nor failure
+            raise
+
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        if response.status_code not in RETRYABLE_STATUS:
+            return response
+
+        delay = backoff_delay(attempt, retry_after_seconds(response))
+        attempt += 1
+        if attempt >= RETRY_MAX_ATTEMPTS or time.monotonic() + delay >= deadline:
+            return response
+
+        print(f"Warning: {breaker.name} returned {response.status_code}, retrying in {delay:.1f}s")
+        if stream:
+            await response.aclose()
+        await asyncio.sleep(delay)
@@ -1,6 +1,12 @@
+import asyncio
+import re
+import time
 import httpx
 from typing import AsyncGenerator
-from app.config import SARVAM_API_KEY
+from app.config import SARVAM_API_KEY, TTS_MIN_SENTENCE_CHARS, SARVAM_RETRY_DEADLINE
+from app.services.resilience_service import sarvam_breaker, send_with_retry
+
+_SENTENCE = re.compile(r"\S.*?(?:[.!?…。]+[\"'”’)\]]*(?=\s)|$)", re.DOTALL)
 
 async def stream_voice_from_sarvam(text: str) -> AsyncGenerator[bytes, None]:
     if not SARVAM_API_KEY:
@@ -23,14 +29,83 @@ async def stream_voice_from_sarvam(text: str) -> AsyncGenerator[bytes, None]:
     }
     
     async with httpx.AsyncClient() as client:
-        # Increase timeout or keep it standard since it's streaming
-        async with client.stream("POST", url, headers=headers, json=data, timeout=30.0) as response:
-            try:
-                response.raise_for_status()
-                async for chunk in response.aiter_bytes(chunk_size=8192):
-                    if chunk:
-                        yield chunk
-            except httpx.HTTPStatusError as e:
-                # To get text of error, we must read it
-                await response.aread()
-                raise ValueError(f"Sarvam API Error: {response.status_code} - {response.text}") from e
+        # Increase timeout or keep it standard since it's streaming.
+        # 429/503 are retried (honouring Retry-After) within SARVAM_RETRY_DEADLINE;
+        # an open circuit raises CircuitOpenError without calling Sarvam.
+        response = await send_with_retry(
+            client,
+            sarvam_breaker,
+            "POST",
+            url,
+            deadline=time.monotonic() + SARVAM_RETRY_DEADLINE,
+            stream=True,
+            headers=headers,
+            json=data,
+            timeout=30.0,
+        )
+        try:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(chunk_size=8192):
+                if chunk:
+                    yield chunk
+        except httpx.HTTPStatusError as e:
+            # To get text of error, we must read it
+            await response.aread()
+            raise ValueError(f"Sarvam API Error: {response.status_code} - {response.text}") from e
+        finally:
+            await response.aclose()
+
+
+def split_sentences(text: str) -> list[str]:
+    """
+    Splits text on sentence boundaries, merging fragments shorter than
+    TTS_MIN_SENTENCE_CHARS into the previous sentence so that interjections
+    like "Hey!" don't each cost a separate request.
+    """
+    sentences: list[str] = []
+    for match in _SENTENCE.finditer(text.strip()):
+        piece = match.group().strip()
+        if sentences and (len(piece) < TTS_MIN_SENTENCE_CHARS or len(sentences[-1]) < TTS_MIN_SENTENCE_CHARS):
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        else:
+            sentences.append(piece)
+    return sentences
+
+
+async def stream_voice_pipeline(text: str, limiter: asyncio.Semaphore) -> AsyncGenerator[bytes, None]:
+    """
+    Synthesises `text` sentence by sentence, with up to `limiter`'s worth of
+    Sarvam requests in flight, and yields MP3 bytes strictly in sentence order.
+
+    Sentence 1 is forwarded as soon as its bytes arrive while later sentences
+    render in the background and are buffered until their turn. MP3 is a
+    frame-based format, so the concatenated segments play as one stream.
+    """
+    sentences = split_sentences(text)
+    if len(sentences) <= 1:
+        async for chunk in stream_voice_from_sarvam(text):
+            yield chunk
+        return
+
+    queues: list[asyncio.Queue] = [asyncio.Queue() for _ in sentences]
+
+    async def synthesise(sentence: str, queue: asyncio.Queue) -> None:
+        try:
+            async with limiter:
+                async for chunk in stream_voice_from_sarvam(sentence):
+                    queue.put_nowait(chunk)
+        except Exception as exc:
+            queue.put_nowait(exc)
+        finally:
+            queue.put_nowait(None)  # end-of-sentence marker
+
+    tasks = [asyncio.create_task(synthesise(s, q)) for s, q in zip(sentences, queues)]
+    try:
+        for queue in queues:
+            while (item := await queue.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
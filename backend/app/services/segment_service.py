@@ -0,0 +1,282 @@
+"""
+Segmented (lazy) story generation.
+
+Instead of one completion with up to 50 frames, a segmented story is written
+one quiz at a time. The first segment (title, summary and frames up to the
+first quiz) streams over the normal story WebSocket; every later segment is
+generated when the player reaches it. As soon as a segment is handed out,
+the next one is prefetched in the background, so the player rarely waits —
+and a player who leaves early costs at most one unused segment.
+
+A prefetched segment is written before the player answers the quiz that
+precedes it, so it leaves out that quiz's explanation frame. When the answer
+arrives, the explanation is generated on its own (a single short frame, in
+parallel with any prefetch still running) and prepended, so the learner's
+answer is reacted to right away. Answers are also included in the context of
+every segment generated afterwards. Once the model marks a segment
+"complete" (or SEGMENT_MAX_COUNT is reached) the assembled story is saved.
+
+For production (multiple workers) move this state to Redis.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import httpx
+from fastapi import HTTPException
+
+from app.config import SEGMENT_MAX_COUNT, SEGMENT_PREFETCH, SEGMENT_IDLE_SECONDS
+from app.models.story import Frame, StoryResponse
+from app.services.ai_service import (
+    generate_segment_stream,
+    generate_explanation_stream,
+    parse_story_output,
+)
+from app.services.db_service import save_story_to_db
+from app.services.session_service import Session
+
+
+@dataclass
+class SegmentedStory:
+    session: Session
+    title: str
+    summary: str
+    frames: list[dict] = field(default_factory=list)
+    answers: list[str] = field(default_factory=list)
+    segments: int = 1  # segments generated so far
+    complete: bool = False
+    story_id: Optional[str] = None
+    prefetch: Optional[asyncio.Task] = None
+    touched_at: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def next_id(self) -> int:
+        return max((f["id"] for f in self.frames if isinstance(f["id"], int)), default=0) + 1
+
+
+# ─── Store ────────────────────────────────────────────────────────────────────
+
+_stories: dict[str, SegmentedStory] = {}
+
+
+def _prune_idle() -> None:
+    now = time.monotonic()
+    for session_id, story in list(_stories.items()):
+        if now - story.touched_at > SEGMENT_IDLE_SECONDS:
+            if story.prefetch is not None:
+                story.prefetch.cancel()
+            del _stories[session_id]
+
+
+# ─── Segment shaping ──────────────────────────────────────────────────────────
+
+def _renumber(frames: list[dict], start_id: int) -> None:
+    """
+    Gives the frames consecutive ids from `start_id`, in order, and re-points
+    every nextFrameId (frame or option) to match. References that don't
+    resolve to a frame of the segment, and dead ends before the last frame,
+    go to the following frame.
+    """
+    new_ids: dict = {}
+    for index, frame in enumerate(frames):
+        new_ids.setdefault(frame["id"], start_id + index)  # first one wins if the model repeats an id
+
+    for index, frame in enumerate(frames):
+        following = start_id + index + 1
+        frame["id"] = start_id + index
+        if frame["nextFrameId"] is not None or not frame.get("options"):
+            frame["nextFrameId"] = new_ids.get(frame["nextFrameId"], following)
+        for option in frame.get("options") or []:
+            option["nextFrameId"] = new_ids.get(option["nextFrameId"], following)
+
+
+def _normalise_segment(frames: list[dict], complete: bool, start_id: int) -> list[dict]:
+    """
+    Validates the frames, numbers them from `start_id` (the model may restart
+    or skip ids) and makes the segment's tail consistent: a final segment
+    ends with nextFrameId null, any other segment hands off to the id right
+    after its last frame.
+    """
+    frames = [Frame.model_validate(f).model_dump() for f in frames]
+    if complete:
+        while len(frames) > 1 and frames[-1].get("options"):
+            frames.pop()  # the story can't end on a quiz nobody explains
+    if not frames:
+        return frames
+    _renumber(frames, start_id)
+
+    if complete:
+        frames[-1]["nextFrameId"] = None
+        return frames
+
+    last = frames[-1]
+
+    next_id = last["id"] + 1
+    if last.get("options"):
+        for option in last["options"]:
+            option["nextFrameId"] = next_id
+        last["nextFrameId"] = None
+    else:
+        last["nextFrameId"] = next_id
+    return frames
+
+
+async def _generate_segment(story: SegmentedStory, explain_previous: bool = True) -> tuple[list[dict], bool]:
+    """
+    Generates the segment after story.frames. Returns (frames, complete).
+    With explain_previous=False the segment starts one id later, leaving
+    story.next_id for the explanation frame (see _generate_explanation).
+    """
+    index = story.segments
+    final = index + 1 >= SEGMENT_MAX_COUNT
+    session = story.session
+    start_id = story.next_id if explain_previous else story.next_id + 1
+
+    chunks = []
+    async for chunk in generate_segment_stream(
+        character=session.character,
+        file_content=session.file_content,
+        prompt=session.prompt,
+        user_name=session.user_name,
+        segment_index=index,
+        start_id=start_id,
+        covered=list(story.frames),
+        answers=list(story.answers),
+        final=final,
+        explain_previous=explain_previous,
+    ):
+        chunks.append(chunk)
+
+    segment, salvaged, _ = parse_story_output("".join(chunks), required=())
+    complete = final or (bool(segment.get("complete")) and not salvaged)
+    return _normalise_segment(segment.get("frames") or [], complete, start_id), complete
+
+
+async def _generate_explanation(story: SegmentedStory, answer: str) -> dict:
+    """The frame explaining the quiz that ends story.frames, reacting to `answer`."""
+    session = story.session
+    frame_id = story.next_id
+
+    chunks = []
+    async for chunk in generate_explanation_stream(
+        character=session.character,
+        user_name=session.user_name,
+        covered=list(story.frames),
+        answer=answer,
+        frame_id=frame_id,
+        next_id=frame_id + 1,
+    ):
+        chunks.append(chunk)
+
+    parsed, _, _ = parse_story_output("".join(chunks), required=())
+    frames = parsed.get("frames") or []
+    if not frames:
+        raise ValueError("The explanation frame was empty.")
+    frame = Frame.model_validate(frames[0]).model_dump()
+    frame.update(id=frame_id, options=None, nextFrameId=frame_id + 1)
+    return frame
+
+
+async def _answered_segment(story: SegmentedStory, prefetch: asyncio.Task, answer: str) -> tuple[list[dict], bool]:
+    """Completes a prefetched segment with the explanation of the answered quiz."""
+    explanation = asyncio.create_task(_generate_explanation(story, answer))
+    try:
+        frames, complete = await asyncio.shield(prefetch)  # kept for a retry if we're cancelled
+        frame = await explanation
+    finally:
+        explanation.cancel()  # no-op once done; stops it if the prefetch failed
+    return _normalise_segment([frame, *frames], complete, frame["id"]), complete
+
+
+def _start_prefetch(story: SegmentedStory) -> None:
+    if SEGMENT_PREFETCH and not story.complete and story.prefetch is None:
+        story.prefetch = asyncio.create_task(_generate_segment(story, explain_previous=False))
+
+
+def _prefetch_usable(task: Optional[asyncio.Task]) -> bool:
+    """False once the prefetch task has failed (a retry should start over)."""
+    return task is not None and not (task.done() and (task.cancelled() or task.exception() is not None))
+
+
+async def _finish(story: SegmentedStory) -> None:
+    assembled = StoryResponse(title=story.title, summary=story.summary, frames=story.frames)
+    story.story_id = await save_story_to_db(assembled.model_dump(exclude_none=True), story.session.owner_id)
+
+
+# ─── Public API ───────────────────────────────────────────────────────────────
+
+async def begin_segmented_story(session_id: str, session: Session, first: dict) -> dict:
+    """
+    Registers a segmented story from its parsed first segment and starts
+    prefetching the second. Returns the normalised first segment as a story
+    dict (title, summary, frames).
+    """
+    _prune_idle()
+    complete = bool(first.get("complete"))
+    story = SegmentedStory(
+        session=session,
+        title=first.get("title", ""),
+        summary=first.get("summary", ""),
+        frames=_normalise_segment(first.get("frames") or [], complete, 1),
+        complete=complete,
+    )
+    _stories[session_id] = story
+
+    if complete:
+        await _finish(story)
+    else:
+        _start_prefetch(story)
+    return {"id": story.story_id, "title": story.title, "summary": story.summary, "frames": story.frames}
+
+
+async def next_segment(session_id: str, answer: str = "") -> dict:
+    """
+    Returns the next segment of a segmented story, recording the player's
+    answer to the quiz that ended the previous one.
+
+    Raises:
+        HTTPException 404 — unknown or expired session.
+        HTTPException 502 — the segment could not be generated.
+    """
+    _prune_idle()
+    story = _stories.get(session_id)
+    if story is None:
+        raise HTTPException(status_code=404, detail="Segmented story not found or has expired.")
+
+    async with story.lock:
+        story.touched_at = time.monotonic()
+        if story.complete:
+            return {"frames": [], "complete": True, "story_id": story.story_id}
+
+        if not _prefetch_usable(story.prefetch):
+            story.prefetch = None
+
+        prefetch = story.prefetch
+        story.answers.append(answer)
+        succeeded = False
+        try:
+            if prefetch is not None:
+                frames, complete = await _answered_segment(story, prefetch, answer)
+            else:
+                frames, complete = await _generate_segment(story)
+            succeeded = True
+        except (RuntimeError, ValueError, TypeError, httpx.HTTPError) as exc:
+            raise HTTPException(status_code=502, detail=f"Failed to generate the next segment: {exc}")
+        finally:
+            if not succeeded:
+                story.answers.pop()  # the client will retry with the same answer
+
+        story.prefetch = None
+
+        story.frames.extend(frames)
+        story.segments += 1
+        story.complete = complete
+        if complete:
+            await _finish(story)
+        else:
+            _start_prefetch(story)
+
+    return {"frames": frames, "complete": complete, "story_id": story.story_id}
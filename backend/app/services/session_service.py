@@ -26,6 +26,8 @@ class Session:
     file_content: str
     prompt: str
     user_name: str
+    owner_id: str = ""
+    segmented: bool = False
     created_at: float = field(default_factory=time.monotonic)
 
 
@@ -41,6 +43,8 @@ async def create_session(
     file_content: str,
     prompt: str,
     user_name: str = "",
+    owner_id: str = "",
+    segmented: bool = False,
 ) -> None:
     async with _lock:
         _store[session_id] = Session(
@@ -48,6 +52,8 @@ async def create_session(
             file_content=file_content,
             prompt=prompt,
             user_name=user_name,
+            owner_id=owner_id,
+            segmented=segmented,
         )
 
 
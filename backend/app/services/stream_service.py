@@ -0,0 +1,303 @@
+"""
+Resumable story streams.
+
+Generation is decoupled from the WebSocket: once a session is consumed, the
+OpenRouter stream runs in a background task that writes every token into a
+bounded per-session replay buffer. Any number of WebSocket connections can
+follow that buffer from an offset, so a client that drops mid-stream
+reconnects with ?offset=N and picks up where it left off.
+
+Offsets count UTF-16 code units, the unit of a JavaScript string's length,
+so a browser can send the total length of the chunks it has received; an
+emoji counts as 2. Python strings count code points, hence utf16_len().
+
+The finished story is parsed and persisted by the background task itself,
+whether or not a client is still attached. Finished streams are retained for
+STREAM_RETAIN_SECONDS so late reconnects still receive the "done" event.
+
+Streams can also start speculatively at /story/start, before any socket is
+open. Until the first client attaches, the producer closes the upstream call
+once SPECULATIVE_MAX_BUFFER_CHARS are buffered and, on attach, resumes it as
+a continuation of the buffered text. A watchdog cancels the stream if nobody
+attaches within SPECULATIVE_ATTACH_TIMEOUT.
+
+For production (multiple workers) replace the registry with Redis streams.
+"""
+
+import asyncio
+import bisect
+import hashlib
+from typing import AsyncGenerator, Optional
+
+from app.config import (
+    STREAM_BUFFER_MAX_CHARS,
+    STREAM_RETAIN_SECONDS,
+    SPECULATIVE_MAX_BUFFER_CHARS,
+    SPECULATIVE_ATTACH_TIMEOUT,
+)
+from app.models.story import StoryResponse
+from app.services.ai_service import generate_story_stream, generate_segment_stream, parse_story_output
+from app.services.db_service import save_story_to_db
+from app.services.session_service import Session, get_and_delete_session
+from app.services.segment_service import begin_segmented_story
+
+
+def utf16_len(text: str) -> int:
+    """Length of `text` in UTF-16 code units (the length a browser sees)."""
+    return len(text.encode("utf-16-le", "surrogatepass")) // 2
+
+
+def _skip_utf16(text: str, units: int) -> str:
+    """`text` without its first `units` UTF-16 code units, never splitting a character."""
+    if not text.isascii():
+        count = 0
+        for index, char in enumerate(text):
+            count += 2 if ord(char) > 0xFFFF else 1
+            if count > units:
+                return text[index:]  # an offset inside a surrogate pair resends the character
+        return ""
+    return text[units:]
+
+
+def _without_nulls(value):
+    """Drops None-valued keys recursively; a missing key and null mean the same to clients."""
+    if isinstance(value, dict):
+        return {k: _without_nulls(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_without_nulls(v) for v in value]
+    return value
+
+
+class StoryStream:
+    """Replay buffer + background generation task for one session."""
+
+    def __init__(self, session_id: str, session: Session, speculative: bool = False):
+        self.session_id = session_id
+        self.session = session
+        self.speculative = speculative
+        self.story: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.salvaged = False  # story was rebuilt from a truncated prefix
+        self.verbatim = False  # the streamed text parses to exactly self.story
+        self.digest: Optional[str] = None  # SHA-256 of the streamed text
+        self.finished = False
+
+        self._chunks: list[str] = []
+        self._ends: list[int] = []  # cumulative UTF-16 end offset of each chunk
+        self._length = 0  # in characters, for the buffer caps
+        self._units = 0  # in UTF-16 code units, for client offsets
+        self._cond = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self._attached = asyncio.Event()
+        if not speculative:
+            self._attached.set()
+
+    @property
+    def length(self) -> int:
+        return self._length
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    @property
+    def rewritten(self) -> bool:
+        """True if the final story differs from what parsing the streamed text gives."""
+        return not self.verbatim
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+        if self.speculative:
+            self._watchdog = asyncio.create_task(self._abort_if_unattached())
+
+    def attach(self) -> None:
+        self._attached.set()
+
+    async def _abort_if_unattached(self) -> None:
+        try:
+            await asyncio.wait_for(self._attached.wait(), SPECULATIVE_ATTACH_TIMEOUT)
+        except asyncio.TimeoutError:
+            if self.finished:
+                return  # already paid for and saved — keep it for a late attach
+            print(f"Warning: Speculative stream {self.session_id} was never attached, aborting")
+            _store.pop(self.session_id, None)
+            self._task.cancel()
+
+    # ── Producer ──────────────────────────────────────────────────────────────
+
+    async def _run(self) -> None:
+        try:
+            while await self._pump(self._generate(resume_from=self.text)):
+                # Capped with nobody watching: the upstream call is closed (no
+                # more tokens billed) and resumes from the buffer on attach
+                print(f"Info: Speculative stream {self.session_id} paused at {self._length} chars")
+                await self._attached.wait()
+            await self._finish_story()
+        except RuntimeError as exc:
+            await self._finish(error=str(exc))
+        except asyncio.CancelledError:
+            await self._finish(error="Story generation was cancelled.")
+            raise
+        except Exception as exc:
+            await self._finish(error=f"Unexpected error during story generation: {exc}")
+        finally:
+            asyncio.get_running_loop().call_later(
+                STREAM_RETAIN_SECONDS, _store.pop, self.session_id, None
+            )
+
+    async def _pump(self, generator) -> bool:
+        """
+        Buffers `generator` until it ends (False) or, before any client has
+        attached, until SPECULATIVE_MAX_BUFFER_CHARS are buffered (True).
+        The generator is closed either way, which closes the upstream request.
+        """
+        try:
+            async for chunk in generator:
+                if self._length + len(chunk) > STREAM_BUFFER_MAX_CHARS:
+                    raise RuntimeError(
+                        f"Story output exceeded the {STREAM_BUFFER_MAX_CHARS}-character stream buffer."
+                    )
+                await self._append(chunk)
+                if not self._attached.is_set() and self._length >= SPECULATIVE_MAX_BUFFER_CHARS:
+                    return True
+            return False
+        finally:
+            await generator.aclose()
+
+    def _generate(self, resume_from: str = ""):
+        if self.session.segmented:
+            return generate_segment_stream(
+                character=self.session.character,
+                file_content=self.session.file_content,
+                prompt=self.session.prompt,
+                user_name=self.session.user_name,
+                segment_index=0,
+                start_id=1,
+                covered=[],
+                answers=[],
+                resume_from=resume_from,
+            )
+        return generate_story_stream(
+            character=self.session.character,
+            file_content=self.session.file_content,
+            prompt=self.session.prompt,
+            user_name=self.session.user_name,
+            resume_from=resume_from,
+        )
+
+    async def _append(self, chunk: str) -> None:
+        async with self._cond:
+            self._chunks.append(chunk)
+            self._length += len(chunk)
+            self._units += utf16_len(chunk)
+            self._ends.append(self._units)
+            self._cond.notify_all()
+
+    async def _finish_story(self) -> None:
+        accumulated = self.text
+        self.digest = hashlib.sha256(accumulated.encode("utf-8")).hexdigest()
+        try:
+            story_dict, self.salvaged, exact = parse_story_output(accumulated)
+            if self.session.segmented:
+                # Only the first segment streams here; the rest is lazy
+                story_dict = await begin_segmented_story(self.session_id, self.session, story_dict)
+                await self._finish(story=story_dict)
+                return
+            # The only validation pass: model output is untrusted
+            validated = StoryResponse.model_validate(story_dict)
+            # Validation may coerce ids or drop stray keys; then the client's copy differs too
+            self.verbatim = exact and _without_nulls(validated.model_dump()) == _without_nulls(
+                {key: story_dict.get(key) for key in ("title", "summary", "frames")}
+            )
+            story_dict = validated.model_dump()
+        except (ValueError, TypeError) as exc:
+            await self._finish(
+                error=f"Failed to parse completed story JSON: {exc}. "
+                f"Raw output (first 500 chars): {accumulated[:500]}"
+            )
+            return
+
+        # Stored without null keys, as always; get_story_from_db readers fill them back in
+        story_dict["id"] = await save_story_to_db(
+            validated.model_dump(exclude_none=True), self.session.owner_id
+        )
+        await self._finish(story=story_dict)
+
+    async def _finish(self, story: Optional[dict] = None, error: Optional[str] = None) -> None:
+        async with self._cond:
+            self.story = story
+            self.error = error
+            self.finished = True
+            self._cond.notify_all()
+
+    # ── Consumers ─────────────────────────────────────────────────────────────
+
+    async def follow(self, offset: int = 0) -> AsyncGenerator[str, None]:
+        """
+        Yields buffered text from `offset` (UTF-16 code units) onwards, then
+        follows live output until generation finishes. Each yielded value is
+        a contiguous slice.
+        """
+        offset = max(0, offset)
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._units > offset or self.finished)
+                pending = self._slice_from(offset)
+                end = self._units
+                finished = self.finished
+
+            if pending:
+                offset = end
+                yield pending
+            elif finished:
+                return
+
+    def _slice_from(self, offset: int) -> str:
+        if offset >= self._units:
+            return ""
+        index = bisect.bisect_right(self._ends, offset)
+        start_of_chunk = self._ends[index - 1] if index > 0 else 0
+        head = _skip_utf16(self._chunks[index], offset - start_of_chunk)
+        return head + "".join(self._chunks[index + 1:])
+
+
+# ─── Registry ─────────────────────────────────────────────────────────────────
+
+_store: dict[str, StoryStream] = {}
+_lock = asyncio.Lock()
+
+
+async def attach_stream(session_id: str) -> Optional[StoryStream]:
+    """
+    Returns the running (or recently finished) stream for `session_id`.
+
+    The first attach consumes the session and starts generation; later
+    attaches (reconnects) join the existing stream. Returns None if neither a
+    stream nor a live session exists.
+    """
+    async with _lock:
+        stream = _store.get(session_id)
+        if stream is not None:
+            stream.attach()
+            return stream
+
+        session = await get_and_delete_session(session_id)
+        if session is None:
+            return None
+
+        stream = StoryStream(session_id, session)
+        _store[session_id] = stream
+        stream.start()
+        return stream
+
+
+async def start_speculative_stream(session_id: str, session: Session) -> StoryStream:
+    """
+    Starts generation for a new session right away, before any WebSocket has
+    attached. The first attach_stream() call for `session_id` joins it.
+    """
+    async with _lock:
+        stream = StoryStream(session_id, session, speculative=True)
+        _store[session_id] = stream
+        stream.start()
+        return stream
@@ -0,0 +1,106 @@
+"""
+Wire encodings for the story WebSocket.
+
+The protocol version is negotiated through the WebSocket subprotocol header
+(`Sec-WebSocket-Protocol`). Clients that offer nothing get the original v1
+JSON protocol, so existing integrations keep working.
+
+  v1  (default)                 {"type": "chunk", "content": "..."}
+                                {"type": "done",  "story": {...}}
+                                {"type": "error", "detail": "..."}
+                                {"type": "reconnect", "offset": N}
+
+  v2  paperplayground.v2.json     text frames with short keys
+      paperplayground.v2.msgpack  binary MessagePack frames (if installed)
+                                {"t": "c", "c": "..."}
+                                {"t": "d", "id": "...", "sha256": "..."}
+                                {"t": "e", "detail": "..."}
+                                {"t": "r", "offset": N}
+
+In v2 the client already holds every streamed chunk, so "done" carries only
+the stored story id and the SHA-256 of the streamed text; the client parses
+its own copy. The full story is included whenever parsing the streamed text
+would not give exactly the result: a salvaged truncated output, stripped
+fences or trailing text, values changed by validation, or a normalised first
+segment.
+
+"reconnect" is sent when the server shuts down mid-stream: the client should
+reconnect with ?offset=N to continue. Offsets count UTF-16 code units of the
+chunk content, the same as a JavaScript string's length.
+
+Per-message deflate is negotiated by the ASGI server (uvicorn enables it by
+default) and applies to every version.
+"""
+
+from typing import Any, Optional
+
+from app.services.connection_service import Connection
+from app.services.json_service import dumps_text
+
+try:
+    import msgpack
+    _MSGPACK_AVAILABLE = True
+except ImportError:
+    _MSGPACK_AVAILABLE = False
+
+
+SUBPROTOCOL_V2_JSON = "paperplayground.v2.json"
+SUBPROTOCOL_V2_MSGPACK = "paperplayground.v2.msgpack"
+
+
+class StoryWireEncoder:
+    """Sends story stream events in the negotiated encoding."""
+
+    def __init__(self, version: int = 1, binary: bool = False, subprotocol: Optional[str] = None):
+        self.version = version
+        self.binary = binary
+        self.subprotocol = subprotocol
+
+    async def _send(self, conn: Connection, message: dict[str, Any]) -> None:
+        if self.binary:
+            await conn.send_bytes(msgpack.packb(message, use_bin_type=True))
+        else:
+            await conn.send_text(dumps_text(message))
+
+    async def send_chunk(self, conn: Connection, content: str) -> None:
+        if self.version == 1:
+            await self._send(conn, {"type": "chunk", "content": content})
+        else:
+            await self._send(conn, {"t": "c", "c": content})
+
+    async def send_done(
+        self,
+        conn: Connection,
+        story: dict[str, Any],
+        digest: str,
+        include_story: bool = False,
+    ) -> None:
+        if self.version == 1:
+            await self._send(conn, {"type": "done", "story": story})
+            return
+
+        message = {"t": "d", "id": story.get("id"), "sha256": digest}
+        if include_story:
+            message["story"] = story
+        await self._send(conn, message)
+
+    async def send_error(self, conn: Connection, detail: str) -> None:
+        if self.version == 1:
+            await self._send(conn, {"type": "error", "detail": detail})
+        else:
+            await self._send(conn, {"t": "e", "detail": detail})
+
+    async def send_reconnect(self, conn: Connection, offset: int) -> None:
+        if self.version == 1:
+            await self._send(conn, {"type": "reconnect", "offset": offset})
+        else:
+            await self._send(conn, {"t": "r", "offset": offset})
+
+
+def negotiate_encoder(offered: list[str]) -> StoryWireEncoder:
+    """Picks the best encoding among the subprotocols offered by the client."""
+    if SUBPROTOCOL_V2_MSGPACK in offered and _MSGPACK_AVAILABLE:
+        return StoryWireEncoder(version=2, binary=True, subprotocol=SUBPROTOCOL_V2_MSGPACK)
+    if SUBPROTOCOL_V2_JSON in offered:
+        return StoryWireEncoder(version=2, subprotocol=SUBPROTOCOL_V2_JSON)
+    return StoryWireEncoder()
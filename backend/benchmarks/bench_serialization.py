@@ -0,0 +1,85 @@
+"""
+Micro-benchmark for the story serialisation hot paths (50-frame story).
+
+Run from backend/:
+    python -m benchmarks.bench_serialization
+
+Compares the previous code paths against app.services.json_service:
+  - per-token WebSocket chunk events
+  - the "done" event (validate + dump + json.dumps vs. one validated dump)
+  - GET /story/{id} (StoryResponse(**doc) + response_model vs. trusted dump)
+"""
+
+import json
+import timeit
+
+from app.models.story import StoryResponse
+from app.services.json_service import _ORJSON_AVAILABLE, dumps, dumps_text, story_payload
+
+
+def _sample_story(frame_count: int = 50) -> dict:
+    frames = []
+    for i in range(1, frame_count + 1):
+        frame = {
+            "id": i,
+            "speaker": "Yuki",
+            "text": "The mitochondria produces ATP — the cell's energy currency — through three stages. " * 2,
+            "emotion": "happy",
+            "nextFrameId": i + 1 if i < frame_count else None,
+        }
+        if i % 8 == 0:
+            frame["options"] = [
+                {"text": "Glucose", "nextFrameId": i + 1},
+                {"text": "ATP", "nextFrameId": i + 1},
+                {"text": "CO₂", "nextFrameId": i + 1},
+            ]
+        frames.append(frame)
+    return {"id": "665f1c2d4b7e4a1f9c3d2e5f", "title": "The Mitochondria Chronicles",
+            "summary": "Yuki walks you through cellular energy production.", "frames": frames}
+
+
+def _bench(label: str, fn, number: int) -> float:
+    seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"  {label:<44} {seconds * 1e6:10.1f} µs")
+    return seconds
+
+
+def main() -> None:
+    story = _sample_story()
+    tokens = [piece + " " for piece in json.dumps(story).split(" ")]
+    print(f"orjson available: {_ORJSON_AVAILABLE}; {len(story['frames'])} frames, {len(tokens)} chunks\n")
+
+    print("WebSocket chunk events (all chunks of one story)")
+    before = _bench("json.dumps per chunk", lambda: [json.dumps({"type": "chunk", "content": t}) for t in tokens], 20)
+    after = _bench("dumps_text per chunk", lambda: [dumps_text({"type": "chunk", "content": t}) for t in tokens], 20)
+    print(f"  speed-up ×{before / after:.1f}\n")
+
+    print('"done" event')
+
+    def done_before():
+        s = StoryResponse(**story)
+        s.model_dump(exclude_none=True)  # the copy that was saved
+        return json.dumps({"type": "done", "story": s.model_dump()})
+
+    def done_after():
+        return dumps_text({"type": "done", "story": StoryResponse.model_validate(story).model_dump()})
+
+    before = _bench("validate + 2 dumps + json.dumps", done_before, 500)
+    after = _bench("validate once + dumps_text", done_after, 500)
+    print(f"  speed-up ×{before / after:.1f}\n")
+
+    print("GET /story/{id} body")
+
+    def get_before():
+        # StoryResponse(**doc) in the route, then response_model re-validation
+        s = StoryResponse(**story)
+        s = StoryResponse.model_validate(s.model_dump())
+        return json.dumps(s.model_dump()).encode("utf-8")
+
+    before = _bench("construct + response_model + json.dumps", get_before, 500)
+    after = _bench("story_payload + dumps (trusted)", lambda: dumps(story_payload(story)), 500)
+    print(f"  speed-up ×{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,31 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.routers.story_router import router as story_router
 from app.routers.ws_router import router as ws_router
 from app.routers.character_router import router as character_router
+from app.routers.avatar_router import router as avatar_router
+from app.services.connection_service import connections, install_drain_on_signals
+from app.services.db_service import ensure_indexes, backfill_story_summaries
+from app.services.resilience_service import breaker_states
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ensure_indexes()
+    await backfill_story_summaries()
+    install_drain_on_signals(connections)
+    yield
+    await connections.drain()  # no-op if a signal already drained
+
 
 app = FastAPI(
     title="Paper Playground API",
     description="Transforms study material into interactive anime-style visual novel stories.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Allow the Vite dev server (and any origin during development) to call the API
@@ -24,6 +41,7 @@ app.add_middleware(
 app.include_router(story_router, prefix="/api/v1")
 app.include_router(ws_router, prefix="/api/v1")
 app.include_router(character_router, prefix="/api/v1")
+app.include_router(avatar_router, prefix="/api/v1")
 
 
 @app.get("/", tags=["Health"])
@@ -34,3 +52,17 @@ async def root():
 @app.get("/health", tags=["Health"])
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/health/dependencies", tags=["Health"])
+async def dependency_health():
+    """Circuit breaker state per external dependency (closed / open / half_open)."""
+    breakers = breaker_states()
+    status = "ok" if all(b["state"] == "closed" for b in breakers.values()) else "degraded"
+    return {"status": status, "dependencies": breakers}
+
+
+@app.get("/health/connections", tags=["Health"])
+async def connection_health():
+    """Open WebSocket connections on this worker, and whether it is draining."""
+    return connections.snapshot()
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from app.models.story import StoryResponse
+from app.services.ai_service import parse_story_output
+
+
+def _frame(frame_id, next_id=None, options=None):
+    frame = {"id": frame_id, "speaker": "Sensei", "text": "Hi, [there]", "emotion": "happy", "nextFrameId": next_id}
+    if options is not None:
+        frame["options"] = [{"text": text, "nextFrameId": target} for text, target in options]
+    return frame
+
+
+FRAMES = [_frame(1, 2), _frame(2, options=[("A", 3), ("B", 9)]), _frame(3, 4), _frame(4, 5), _frame(5)]
+
+
+def test_salvage_keeps_keys_written_after_frames():
+    text = json.dumps({"frames": FRAMES, "title": "T", "summary": "S", "complete": False})
+
+    story, salvaged, exact = parse_story_output(text[:-8])
+
+    assert salvaged and not exact
+    assert (story["title"], story["summary"], len(story["frames"])) == ("T", "S", 5)
+    StoryResponse.model_validate(story)
+
+
+def test_salvage_refuses_a_story_without_its_summary():
+    text = json.dumps({"frames": FRAMES, "title": "T", "summary": "S"})
+
+    with pytest.raises(ValueError):
+        parse_story_output(text[: text.index('"summary"')])
+
+
+def test_salvage_repoints_links_to_frames_that_were_cut_off():
+    text = json.dumps({"title": "T", "summary": "S", "frames": FRAMES})
+
+    story, salvaged, _ = parse_story_output(text[: text.index('{"id": 4')])
+
+    assert salvaged
+    assert [f["id"] for f in story["frames"]] == [1, 2, 3]
+    assert [o["nextFrameId"] for o in story["frames"][1]["options"]] == [3, 3]
+    assert story["frames"][-1]["nextFrameId"] is None
@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+from app.models.story import Character
+from app.services import segment_service
+from app.services.segment_service import SegmentedStory, _generate_segment, _normalise_segment
+from app.services.session_service import Session
+
+
+def _frame(frame_id, next_id=None, options=None):
+    frame = {"id": frame_id, "speaker": "Sensei", "text": "...", "emotion": "happy", "nextFrameId": next_id}
+    if options is not None:
+        frame["options"] = [{"text": text, "nextFrameId": target} for text, target in options]
+    return frame
+
+
+def test_restarted_ids_are_renumbered_from_start_id():
+    frames = [_frame(1, 2), _frame(2, 3), _frame(3, options=[("A", 4), ("B", 4)])]
+
+    result = _normalise_segment(frames, complete=False, start_id=7)
+
+    assert [f["id"] for f in result] == [7, 8, 9]
+    assert [f["nextFrameId"] for f in result] == [8, 9, None]
+    assert [o["nextFrameId"] for o in result[-1]["options"]] == [10, 10]
+
+
+def test_unresolved_and_skipped_references_point_to_the_following_frame():
+    frames = [_frame(5, 40), _frame(9), _frame(12, 9), _frame(13, 14)]
+
+    result = _normalise_segment(frames, complete=False, start_id=5)
+
+    assert [f["id"] for f in result] == [5, 6, 7, 8]
+    assert [f["nextFrameId"] for f in result] == [6, 7, 6, 9]
+
+
+def test_generated_segment_continues_after_the_story(monkeypatch):
+    async def fake_stream(**kwargs):
+        assert kwargs["start_id"] == 4
+        yield json.dumps({"frames": [_frame(1, 2), _frame(2, options=[("A", 3), ("B", 3)])]})
+
+    monkeypatch.setattr(segment_service, "generate_segment_stream", fake_stream)
+    session = Session(
+        character=Character(name="Sensei", description="", tone=""),
+        file_content="",
+        prompt="",
+        user_name="",
+    )
+    story = SegmentedStory(
+        session=session,
+        title="T",
+        summary="S",
+        frames=[_frame(1, 2), _frame(2, 3), _frame(3, options=[("A", 4), ("B", 4)])],
+    )
+
+    frames, complete = asyncio.run(_generate_segment(story))
+
+    assert not complete
+    assert [f["id"] for f in frames] == [4, 5]
+    assert [o["nextFrameId"] for o in frames[-1]["options"]] == [6, 6]
@@ -0,0 +1,40 @@
+import asyncio
+import json
+
+from app.models.story import Character
+from app.services import stream_service
+from app.services.session_service import Session
+from app.services.stream_service import StoryStream
+
+
+def test_finished_story_is_stored_without_null_keys(monkeypatch):
+    saved = []
+
+    async def fake_save(story_dict, owner_id=""):
+        saved.append(story_dict)
+        return "665f00000000000000000000"
+
+    monkeypatch.setattr(stream_service, "save_story_to_db", fake_save)
+    session = Session(
+        character=Character(name="Sensei", description="", tone=""),
+        file_content="",
+        prompt="",
+        user_name="",
+    )
+    frames = [
+        {"id": 1, "speaker": "Sensei", "text": "Hi", "emotion": "happy", "nextFrameId": 2},
+        {"id": 2, "speaker": "Sensei", "text": "Bye", "emotion": "happy", "nextFrameId": None},
+    ]
+
+    async def run():
+        stream = StoryStream("session", session)
+        await stream._append(json.dumps({"title": "T", "summary": "S", "frames": frames}))
+        await stream._finish_story()
+        return stream
+
+    stream = asyncio.run(run())
+
+    assert saved[0]["frames"] == [frames[0], {k: v for k, v in frames[1].items() if v is not None}]
+    assert "id" not in saved[0]
+    assert stream.story["frames"][0]["options"] is None
+    assert stream.verbatim
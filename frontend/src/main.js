@@ -73,7 +73,7 @@ window.renderCharacterSelection = () => {
 
     card.innerHTML = `
             <div class="char-avatar-container">
-                <img src="${char.avatar}" alt="${char.name}">
+                <img src="${char.avatarVariants?.card ?? char.avatar}" alt="${char.name}">
             </div>
             <div class="char-name-label">${char.name}</div>
         `;
@@ -306,7 +306,7 @@ window.renderCharacterGallery = () => {
 
     card.innerHTML = `
             <div class="char-avatar-container">
-                <img src="${char.avatar}" alt="${char.name}">
+                <img src="${char.avatarVariants?.card ?? char.avatar}" alt="${char.name}">
             </div>
             <div class="char-name-label">${char.name}</div>
         `;
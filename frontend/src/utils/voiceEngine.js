@@ -1,5 +1,9 @@
 import { BASE_URL } from "./api.js";
 
+const RECONNECT_BASE_MS = 1000;
+const RECONNECT_MAX_MS = 30000;
+const CLOSE_IDLE = 1000; // server closed an idle socket; reconnect on next speak()
+
 export class VoiceStreamEngine {
   constructor() {
     this.ws = null;
@@ -26,10 +30,17 @@ export class VoiceStreamEngine {
     this.queue = [];
     this.chunks = []; // Save all chunks just in case
 
+    this.reconnectAttempts = 0;
+    this.reconnectTimer = null;
+    this.pendingText = null; // spoken while disconnected; sent on open
+
     this.connect();
   }
 
   connect() {
+    clearTimeout(this.reconnectTimer);
+    this.reconnectTimer = null;
+
     const wsUrl = BASE_URL.replace(/^http/, "ws");
     this.ws = new WebSocket(`${wsUrl}/voice/stream`);
     this.ws.binaryType = "arraybuffer";
@@ -37,6 +48,12 @@ export class VoiceStreamEngine {
     this.ws.onopen = () => {
       console.log("Voice MS WebSocket connected");
       this.isConnected = true;
+      this.reconnectAttempts = 0;
+      if (this.pendingText !== null) {
+        const text = this.pendingText;
+        this.pendingText = null;
+        this.ws.send(JSON.stringify({ text }));
+      }
     };
 
     this.ws.onmessage = (event) => {
@@ -47,19 +64,41 @@ export class VoiceStreamEngine {
       } else {
         try {
           const parsed = JSON.parse(event.data);
-          if (parsed.type === "error")
+          if (parsed.type === "ping")
+            this.ws.send(JSON.stringify({ type: "pong" }));
+          else if (parsed.type === "error")
             console.error("Voice Stream Error:", parsed.error);
         } catch (e) {}
       }
     };
 
-    this.ws.onclose = () => {
-      console.log("Voice MS WebSocket closed, reconnecting in 2s...");
+    this.ws.onclose = (event) => {
       this.isConnected = false;
-      setTimeout(() => this.connect(), 2000);
+      this.ws = null;
+      if (event.code === CLOSE_IDLE) {
+        console.log("Voice MS WebSocket closed (idle), reconnecting on demand");
+        return;
+      }
+      this.scheduleReconnect();
     };
   }
 
+  // Exponential backoff with full jitter, so a restarting server isn't
+  // hit by every client at once.
+  scheduleReconnect() {
+    if (this.reconnectTimer) return;
+    const cap = Math.min(
+      RECONNECT_MAX_MS,
+      RECONNECT_BASE_MS * 2 ** this.reconnectAttempts,
+    );
+    const delay = Math.random() * cap;
+    this.reconnectAttempts += 1;
+    console.log(
+      `Voice MS WebSocket closed, reconnecting in ${Math.round(delay)}ms...`,
+    );
+    this.reconnectTimer = setTimeout(() => this.connect(), delay);
+  }
+
   processQueue() {
     if (
       !this.sourceBuffer ||
@@ -81,9 +120,8 @@ export class VoiceStreamEngine {
   }
 
   speak(text) {
-    if (!this.isConnected) {
-      console.warn("Voice Engine is not connected to WebSocket");
-      return;
+    if (!this.isConnected && !this.ws && !this.reconnectTimer) {
+      this.connect(); // closed while idle
     }
 
     console.log("Speaking text:", text);
@@ -107,8 +145,9 @@ export class VoiceStreamEngine {
       }
     });
 
-    // Send text to start streaming MP3 back
-    this.ws.send(JSON.stringify({ text }));
+    // Send text to start streaming MP3 back (or once the socket opens)
+    if (this.isConnected) this.ws.send(JSON.stringify({ text }));
+    else this.pendingText = text;
   }
 
   stop() {